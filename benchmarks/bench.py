@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+"""Time treecrawl against a synthetic tree
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --compare results.json
+
+Results are JSON so runs from different versions can be compared. see
+python benchmarks/bench.py --help for the tree shape options. treecrawl must
+be importable (pip install -e .)
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from treegen import make_tree
+
+import treecrawl
+from treecrawl.casehelper import CaseHelper
+from treecrawl.transformer import Transformer
+from treecrawl.utility import (
+    compare_directories,
+    file_to_string,
+    get_all_files,
+)
+
+
+class UpperBench(Transformer):
+    """Upper case every .txt file"""
+
+    def is_target(self, i_file):
+        return i_file.endswith(".txt")
+
+    def transform(self, source_file, destination_file):
+        contents = file_to_string(source_file)
+        if self.dry_run:
+            return
+        self.write_output(contents.upper(), destination_file)
+
+
+def _transformer(tree, output, dry_run=False, jobs=1, backend="process"):
+    t = UpperBench(tree, output, log_level="WARNING", dry_run=dry_run)
+    t.jobs = jobs
+    t.backend = backend
+    return t
+
+
+def scenario_crawl(tree, work, jobs):
+    get_all_files(tree)
+
+
+def scenario_dry_run(tree, work, jobs):
+    _transformer(tree, os.path.join(work, "out"), dry_run=True).run()
+
+
+def scenario_transform(tree, work, jobs):
+    _transformer(tree, os.path.join(work, "out")).run()
+
+
+def scenario_transform_threads(tree, work, jobs):
+    out = os.path.join(work, "out")
+    _transformer(tree, out, jobs=jobs, backend="thread").run()
+
+
+def scenario_transform_processes(tree, work, jobs):
+    out = os.path.join(work, "out")
+    _transformer(tree, out, jobs=jobs, backend="process").run()
+
+
+def scenario_compare(tree, work, jobs):
+    # run() copies the tree once, next to the work directories
+    copy = os.path.join(os.path.dirname(work), "copy")
+    assert compare_directories(tree, copy)
+
+
+def scenario_casehelper(tree, work, jobs):
+    # testdata/bench/tree/{input,golden} are links to the tree and its copy
+    testdata = os.path.join(os.path.dirname(work), "testdata")
+    c = CaseHelper(testdata, "bench", "tree", work)
+    shutil.copytree(c.input, c.actual)
+    for succeeded, _ in c.compare():
+        assert succeeded
+
+
+SCENARIOS = {
+    "crawl": scenario_crawl,
+    "dry_run": scenario_dry_run,
+    "transform": scenario_transform,
+    "transform_threads": scenario_transform_threads,
+    "transform_processes": scenario_transform_processes,
+    "compare": scenario_compare,
+    "casehelper": scenario_casehelper,
+}
+
+
+def time_scenario(fn, tree, scratch, repeat, jobs):
+    """Run a scenario repeat times in fresh work directories
+
+    :rtype: List[float]
+    """
+    runs = []
+    for i in range(repeat):
+        work = os.path.join(scratch, "work{}".format(i))
+        os.makedirs(work)
+        start = time.perf_counter()
+        fn(tree, work, jobs)
+        runs.append(time.perf_counter() - start)
+        shutil.rmtree(work)
+    return runs
+
+
+def run(args):
+    scratch = tempfile.mkdtemp(prefix="treecrawl-bench-")
+    try:
+        tree = os.path.join(scratch, "tree")
+        shape = {
+            "depth": args.depth,
+            "fanout": args.fanout,
+            "files_per_dir": args.files_per_dir,
+            "min_size": args.min_size,
+            "max_size": args.max_size,
+            "binary_share": args.binary_share,
+            "seed": args.seed,
+        }
+        counts = make_tree(tree, **shape)
+        shutil.copytree(tree, os.path.join(scratch, "copy"))
+        case = os.path.join(scratch, "testdata", "bench", "tree")
+        os.makedirs(case)
+        os.symlink(tree, os.path.join(case, "input"))
+        os.symlink(os.path.join(scratch, "copy"), os.path.join(case, "golden"))
+
+        results = {}
+        for name in args.scenario or sorted(SCENARIOS):
+            runs = time_scenario(
+                SCENARIOS[name], tree, scratch, args.repeat, args.jobs
+            )
+            best = min(runs)
+            results[name] = {
+                "seconds_min": best,
+                "seconds_median": statistics.median(runs),
+                "runs": runs,
+                "files_per_second": counts["files"] / best if best else None,
+            }
+    finally:
+        shutil.rmtree(scratch)
+
+    return {
+        "treecrawl_version": treecrawl.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "jobs": args.jobs,
+        "repeat": args.repeat,
+        "tree": dict(shape, **counts),
+        "results": results,
+    }
+
+
+def compare(old, new):
+    """Print the change in best time for every scenario in both results"""
+    print("{:<22}{:>12}{:>12}{:>9}".format("scenario", "old", "new", "ratio"))
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        o = old["results"][name]["seconds_min"]
+        n = new["results"][name]["seconds_min"]
+        print("{:<22}{:>12.4f}{:>12.4f}{:>9.2f}".format(name, o, n, n / o))
+    if old["tree"] != new["tree"]:
+        print("WARNING: the trees have different shapes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--files-per-dir", type=int, default=10)
+    parser.add_argument("--min-size", type=int, default=64)
+    parser.add_argument("--max-size", type=int, default=64 * 1024)
+    parser.add_argument("--binary-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="run only this scenario. can be repeated",
+    )
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument(
+        "--compare", help="print the change from an earlier results file"
+    )
+    args = parser.parse_args(argv)
+
+    res = run(args)
+    text = json.dumps(res, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), res)
+    elif not args.output:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
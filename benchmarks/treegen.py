@@ -0,0 +1,107 @@
+"""Generate synthetic directory trees for benchmarks
+
+
+"""
+import os
+import random
+
+WORDS = [
+    "alpha",
+    "bravo",
+    "charlie",
+    "delta",
+    "echo",
+    "foxtrot",
+    "golf",
+    "hotel",
+    "india",
+    "juliet",
+    "kilo",
+    "lima",
+    "mike",
+    "november",
+    "oscar",
+    "papa",
+]
+
+
+def _text(rng, size):
+    """Return about size bytes of lower case words and newlines
+
+    :rtype: bytes
+    """
+    words = []
+    total = 0
+    while total < size:
+        w = rng.choice(WORDS)
+        words.append(w)
+        total += len(w) + 1
+    lines = [
+        " ".join(words[i : i + 12])  # noqa: E203
+        for i in range(0, len(words), 12)
+    ]
+    return ("\n".join(lines) + "\n").encode("utf8")[:size]
+
+
+def _binary(rng, size):
+    # random bytes are full of NULs and invalid utf-8, like real binaries
+    return rng.getrandbits(8 * size).to_bytes(size, "little")
+
+
+def make_tree(
+    root,
+    depth=3,
+    fanout=4,
+    files_per_dir=10,
+    min_size=64,
+    max_size=64 * 1024,
+    binary_share=0.0,
+    seed=0,
+):
+    """Create a synthetic tree under root
+
+    Every directory down to depth has fanout subdirectories and
+    files_per_dir files. File sizes are log-uniform between min_size and
+    max_size, so most files are small with a long tail of big ones, like a
+    source tree. binary_share of the files are random bytes with a ".bin"
+    extension, the rest are ".txt" text. The same arguments always produce
+    the same tree
+
+    :param str root: directory to create. it must not exist
+    :param int depth: levels of subdirectories below root
+    :param int fanout: subdirectories per directory
+    :param int files_per_dir: files per directory
+    :param int min_size: smallest file in bytes
+    :param int max_size: largest file in bytes
+    :param float binary_share: fraction of binary files (0.0 - 1.0)
+    :param int seed: random seed
+
+    :rtype: Dict[str, int]
+    :return: the number of files, directories and bytes created
+    """
+    import math
+
+    rng = random.Random(seed)
+    res = {"files": 0, "dirs": 0, "bytes": 0}
+    log_min, log_max = math.log(min_size), math.log(max_size)
+    os.makedirs(root)
+    stack = [(root, 0)]
+    while stack:
+        d, level = stack.pop()
+        res["dirs"] += 1
+        for i in range(files_per_dir):
+            size = int(math.exp(rng.uniform(log_min, log_max)))
+            if rng.random() < binary_share:
+                name, data = "file{}.bin".format(i), _binary(rng, size)
+            else:
+                name, data = "file{}.txt".format(i), _text(rng, size)
+            with open(os.path.join(d, name), "wb") as f:
+                f.write(data)
+            res["files"] += 1
+            res["bytes"] += len(data)
+        if level < depth:
+            for i in range(fanout):
+                sub = os.path.join(d, "dir{}".format(i))
+                os.mkdir(sub)
+                stack.append((sub, level + 1))
+    return res
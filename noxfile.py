@@ -47,6 +47,13 @@ def test(session):
     session.run("pytest")
 
 
+@nox.session()
+def bench(session):
+    """Run the benchmarks. extra arguments go to benchmarks/bench.py"""
+    session.install("-e", ".")
+    session.run("python", "benchmarks/bench.py", *session.posargs)
+
+
 @nox.session()
 def blacken(session):
     """Run black code formatter."""
@@ -57,6 +64,7 @@ def blacken(session):
         "79",
         "treecrawl",
         "tests",
+        "benchmarks",
         "noxfile.py",
         "setup.py",
     )
@@ -76,6 +84,7 @@ def lint(session):
         "79",
         "treecrawl",
         "tests",
+        "benchmarks",
         "noxfile.py",
         "setup.py",
     )
@@ -84,6 +93,7 @@ def lint(session):
         "flake8",
         "treecrawl",
         "tests",
+        "benchmarks",
         "noxfile.py",
         "setup.py",
     )
@@ -52,6 +52,7 @@ setup(
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
     ],
+    entry_points={"console_scripts": ["treecrawl=treecrawl.cli:main"]},
     description="libraries to make it easier to "
     "maniuplate files in a directory tree",
     install_requires=requirements,
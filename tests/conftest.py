@@ -1,4 +1,5 @@
 import pytest
+from treecrawl.casehelper import GoldenManifests
 from treecrawl.utility import locate_subdir
 
 
@@ -18,3 +19,8 @@ def update_golden(request):
 @pytest.fixture(scope="session", autouse=True)
 def testdata():
     return locate_subdir("testdata")
+
+
+@pytest.fixture(scope="session")
+def golden_manifests():
+    return GoldenManifests()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.asynctransformer`."""
+import os
+import pytest
+from treecrawl.asynctransformer import AsyncTransformer
+from treecrawl.casehelper import CaseHelper
+
+
+class AsyncMakeUpper(AsyncTransformer):
+    """Convert lower case contents of  text files to upper case"""
+
+    def __init__(self, input, output, dry_run=False):
+        super().__init__(input=input, output=output, dry_run=dry_run)
+
+    def is_target(self, i_file):
+        return os.path.isfile(i_file) and i_file.endswith(".txt")
+
+    async def transform(self, source_file, destination_file):
+        contents = await self.read_string(source_file)
+        await self.write_output(contents.upper(), destination_file)
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    ["pets", "cities"],
+)
+def test_async_make_upper(test_case, tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", test_case, str(tmp_path))
+    m = AsyncMakeUpper(c.input, c.actual)
+    m.max_in_flight = 1
+    stats = m.run()
+    assert stats.counts["files_transformed"] == stats.counts["files_targeted"]
+    assert stats.counts["bytes_written"] == stats.counts["bytes_read"] > 0
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+class AsyncFail(AsyncMakeUpper):
+    async def transform(self, source_file, destination_file):
+        raise ValueError("boom")
+
+
+def test_async_failure(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    with pytest.raises(RuntimeError, match="2 of 2 transforms failed"):
+        AsyncFail(c.input, c.actual).run()
+
+
+def test_async_cache_hit_durability(tmp_path, testdata, monkeypatch):
+    import treecrawl.utility
+
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    synced = []
+    monkeypatch.setattr(treecrawl.utility, "fsync_paths", synced.extend)
+    for _ in range(2):
+        m = AsyncMakeUpper(c.input, c.actual)
+        m.cache_dir = str(tmp_path / "cache")
+        m.durability = "batch"
+        m.run()
+    # the second run is all cache hits, and they're synced too
+    assert len(synced) == 4
+    assert len(set(synced)) == 2
+
+
+class RecordCrawlThread(AsyncMakeUpper):
+    async def run_async(self):
+        import threading
+
+        self.loop_thread = threading.get_ident()
+        self.crawl_threads = set()
+        return await super().run_async()
+
+    def is_target(self, i_file):
+        import threading
+
+        self.crawl_threads.add(threading.get_ident())
+        return super().is_target(i_file)
+
+
+def test_async_crawl_off_loop(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = RecordCrawlThread(c.input, c.actual)
+    stats = m.run()
+    assert stats.counts["files_transformed"] == 2
+    assert m.crawl_threads
+    assert m.loop_thread not in m.crawl_threads
+
+
+class AsyncMoveSource(AsyncMakeUpper):
+    async def transform(self, source_file, destination_file):
+        await super().transform(source_file, destination_file)
+        os.rename(source_file, source_file + ".done")
+
+
+def test_async_finish_failure(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.txt").write_text("a")
+    m = AsyncMoveSource(str(tmp_path / "in"), str(tmp_path / "out"))
+    m.manifest = str(tmp_path / "manifest.json")
+    # the manifest can't stat the moved source
+    with pytest.raises(RuntimeError, match="1 of 1 transforms failed"):
+        m.run()
+    assert m.stats.counts["files_failed"] == 1
+    assert "files_transformed" not in m.stats.counts
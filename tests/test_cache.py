@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.cache`."""
+import os
+from treecrawl.cache import ResultCache
+
+
+def test_result_cache(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("abc")
+    out = tmp_path / "out.txt"
+    out.write_text("ABC")
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    key = cache.key("t:1", str(src))
+    assert key != cache.key("t:2", str(src))
+    assert not cache.fetch(key, str(tmp_path / "x" / "copy.txt"))
+    cache.store(key, str(out))
+    assert cache.fetch(key, str(tmp_path / "x" / "copy.txt"))
+    assert (tmp_path / "x" / "copy.txt").read_text() == "ABC"
+
+
+def test_result_cache_evict(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    keys = []
+    for i in range(4):
+        f = tmp_path / "{}.txt".format(i)
+        f.write_text(str(i) * 100)
+        key = cache.key("t:1", str(f))
+        cache.store(key, str(f))
+        os.utime(cache._path(key), ns=(i * 10**9, i * 10**9))
+        keys.append(key)
+
+    # make the oldest entry the most recently used
+    cache.fetch(keys[0], str(tmp_path / "hit.txt"))
+    assert cache.evict() == 2
+    remaining = [k for k in keys if os.path.exists(cache._path(k))]
+    assert remaining == [keys[0], keys[3]]
+
+
+def test_result_cache_store_from_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    out = tmp_path / "out.txt"
+    out.write_text("ABC" * 1000)
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = cache.key("t:1", str(out))
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(lambda _: cache.store(key, str(out)), range(200)))
+    assert os.listdir(os.path.dirname(cache._path(key))) == [key]
+
+    # an in progress store isn't an entry
+    open(cache._path(key) + ".1.2.tmp", "w").close()
+    cache.max_bytes = 0
+    assert cache.evict() == 1
+    assert os.listdir(os.path.dirname(cache._path(key))) == [key + ".1.2.tmp"]
@@ -41,6 +41,14 @@ class MakeUpper(Transformer):
         self.write_string_to_output(contents, destination_file)
 
 
+class HelperUpper(MakeUpper):
+    """MakeUpper using the run aware read_string and write_output helpers"""
+
+    def transform(self, source_file, destination_file):
+        contents = self.read_string(source_file)
+        self.write_output(contents.upper(), destination_file)
+
+
 @pytest.mark.parametrize(
     "test_case",
     ["pets", "cities"],
@@ -54,6 +62,9 @@ def test_populate_temp(test_case, tmp_path, request, testdata, update_golden):
     c = CaseHelper(
         testdata, request.node.originalname, test_case, str(tmp_path)
     )
+    # expected isn't copied until it's needed
+    assert not os.path.exists(c.expected)
+    c.populate_expected()
     assert compare_directories(c.golden, c.expected)
     assert compare_directories(
         os.path.join(c.temp_case_dir, "input"),
@@ -78,7 +89,7 @@ def test_make_upper(test_case, tmp_path, request, testdata, update_golden):
     the project golden files are deleted. This step generates new ones from
     the the function under test """
     if update_golden:
-        _ = MakeUpper(c.input, c.golden)
+        MakeUpper(c.input, c.golden).run()
 
     m = MakeUpper(c.input, c.actual)
     m.run()
@@ -87,3 +98,504 @@ def test_make_upper(test_case, tmp_path, request, testdata, update_golden):
         assert succeeded
         if not succeeded:
             print("input: {}\nactual: {}\nexpected: {}".format(*compared))
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    ["pets", "cities"],
+)
+def test_make_upper_jobs(test_case, tmp_path, request, testdata):
+    """Same cases as test_make_upper, transformed in worker processes"""
+    c = CaseHelper(testdata, "test_make_upper", test_case, str(tmp_path))
+    m = MakeUpper(c.input, c.actual)
+    m.jobs = 2
+    m.run()
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+class FailUpper(MakeUpper):
+    def transform(self, source_file, destination_file):
+        raise ValueError("boom")
+
+
+def test_jobs_failure(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = FailUpper(c.input, c.actual)
+    m.jobs = 2
+    with pytest.raises(RuntimeError, match="2 of 2 transforms failed"):
+        m.run()
+    assert m.stats.counts["files_failed"] == 2
+    assert m.stats.counts["files_transformed"] == 0
+
+
+def test_jobs_invalid():
+    with pytest.raises(RuntimeError, match="jobs must be at least 1"):
+        MakeUpper(None, None, dry_run=True).jobs = 0
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    ["pets", "cities"],
+)
+def test_make_upper_threads(test_case, tmp_path, request, testdata):
+    """Same cases as test_make_upper, transformed in a thread pool"""
+    c = CaseHelper(testdata, "test_make_upper", test_case, str(tmp_path))
+    m = MakeUpper(c.input, c.actual)
+    m.jobs = 4
+    m.backend = "thread"
+    m.max_in_flight = 1
+    m.run()
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+def test_backend_invalid():
+    with pytest.raises(RuntimeError, match="Unknown backend: fork"):
+        MakeUpper(None, None, dry_run=True).backend = "fork"
+
+
+def test_iter_source_dest(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "pets", str(tmp_path))
+    m = MakeUpper(c.input, c.actual)
+    pairs = m.iter_source_dest()
+    assert not isinstance(pairs, dict)
+    pairs = list(pairs)
+    assert len(pairs) == 2
+    assert dict(pairs) == m.source_dest_as_dict()
+    for k, v in pairs:
+        assert v == os.path.join(c.actual, os.path.basename(k))
+
+
+def test_output_inside_input(tmp_path):
+    i_dir = tmp_path / "in"
+    (i_dir / "sub").mkdir(parents=True)
+    for f in ["a.txt", "b.txt", "sub/c.txt"]:
+        (i_dir / f).write_text("x")
+    o_dir = i_dir / "out"
+    for _ in range(2):
+        stats = MakeUpper(str(i_dir), str(o_dir)).run()
+        # the outputs of the first run aren't inputs of the second
+        assert stats.counts["files_targeted"] == 3
+    assert sorted(os.listdir(str(o_dir))) == ["a.txt", "b.txt", "sub"]
+    assert (o_dir / "sub" / "c.txt").read_text() == "X"
+
+
+class OnlyJanes(MakeUpper):
+    """Targeting customized the old way"""
+
+    def source_dest_as_dict(self):
+        res = super().source_dest_as_dict()
+        return {k: v for k, v in res.items() if "janes" in k}
+
+
+def test_source_dest_as_dict_override(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "pets", str(tmp_path))
+    OnlyJanes(c.input, c.actual).run()
+    assert os.listdir(c.actual) == ["janes_pets.txt"]
+
+
+class EntryUpper(MakeUpper):
+    target_entries = True
+
+    def is_target(self, i_file):
+        return i_file.is_file() and i_file.name.endswith(".txt")
+
+
+def test_target_entries(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    EntryUpper(c.input, c.actual).run()
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+def test_exclude_dirs(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = MakeUpper(c.input, c.actual)
+    assert len(m.source_dest_as_dict()) == 2
+    m.exclude_dirs = ("cities", "some_dir")
+    # the input root itself is never pruned
+    assert len(m.source_dest_as_dict()) == 2
+    (tmp_path / "in" / "some_dir").mkdir(parents=True)
+    (tmp_path / "in" / "some_dir" / "x.txt").write_text("x")
+    (tmp_path / "in" / "y.txt").write_text("y")
+    m.input = str(tmp_path / "in")
+    assert list(m.source_dest_as_dict()) == [str(tmp_path / "in" / "y.txt")]
+
+
+class CountingUpper(MakeUpper):
+    def __init__(self, input, output, manifest=None):
+        super().__init__(input=input, output=output)
+        self.manifest = manifest
+        self.transformed = []
+
+    def transform(self, source_file, destination_file):
+        self.transformed.append(os.path.basename(source_file))
+        super().transform(source_file, destination_file)
+
+
+def test_manifest_incremental(tmp_path, testdata):
+    from treecrawl.utility import mkdir_p
+    from shutil import copytree
+
+    c = CaseHelper(testdata, "test_make_upper", "pets", str(tmp_path))
+    i_dir = str(tmp_path / "in")
+    copytree(c.input, i_dir)
+    o_dir = str(tmp_path / "out")
+    manifest = str(tmp_path / "state" / "manifest.json")
+
+    m = CountingUpper(i_dir, o_dir, manifest=manifest)
+    m.run()
+    assert sorted(m.transformed) == ["janes_pets.txt", "johns_pets.txt"]
+
+    # nothing changed
+    m = CountingUpper(i_dir, o_dir, manifest=manifest)
+    m.run()
+    assert m.transformed == []
+
+    # changed input, deleted output and a new file
+    with open(os.path.join(i_dir, "janes_pets.txt"), "a") as f:
+        f.write("more\n")
+    os.remove(os.path.join(o_dir, "johns_pets.txt"))
+    mkdir_p(os.path.join(i_dir, "new"))
+    with open(os.path.join(i_dir, "new", "new.txt"), "w") as f:
+        f.write("new\n")
+    m = CountingUpper(i_dir, o_dir, manifest=manifest)
+    m.run()
+    assert sorted(m.transformed) == [
+        "janes_pets.txt",
+        "johns_pets.txt",
+        "new.txt",
+    ]
+
+    m = CountingUpper(i_dir, o_dir, manifest=manifest)
+    m.full = True
+    m.run()
+    assert len(m.transformed) == 3
+
+
+def test_cache_dir(tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    cache_dir = str(tmp_path / "cache")
+
+    m = CountingUpper(c.input, c.actual)
+    m.cache_dir = cache_dir
+    m.run()
+    assert len(m.transformed) == 2
+
+    # same content, different tree: served from the cache
+    m = CountingUpper(c.input, str(tmp_path / "second"))
+    m.cache_dir = cache_dir
+    m.run()
+    assert m.transformed == []
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+    for f in os.listdir(c.actual):
+        with open(os.path.join(c.actual, f)) as a:
+            with open(str(tmp_path / "second" / f)) as b:
+                assert a.read() == b.read()
+
+    # a new version misses
+    m = CountingUpper(c.input, str(tmp_path / "third"))
+    m.cache_dir = cache_dir
+    m.cache_version = "2"
+    m.run()
+    assert len(m.transformed) == 2
+
+
+def test_cache_dir_write_if_changed(tmp_path):
+    i_dir = tmp_path / "in"
+    i_dir.mkdir()
+    (i_dir / "a.txt").write_text("abc")
+    for _ in range(2):
+        m = CountingUpper(str(i_dir), str(i_dir))
+        m.cache_dir = str(tmp_path / "cache")
+        m.write_if_changed = True
+        m.run()
+    before = os.stat(str(i_dir / "a.txt"))
+
+    # a cache hit for a file that's already right leaves it alone
+    m = CountingUpper(str(i_dir), str(i_dir))
+    m.cache_dir = str(tmp_path / "cache")
+    m.write_if_changed = True
+    stats = m.run()
+    assert m.transformed == []
+    assert stats.counts["unchanged"] == 1
+    assert "changed" not in stats.counts
+    after = os.stat(str(i_dir / "a.txt"))
+    assert (after.st_ino, after.st_mtime_ns) == (
+        before.st_ino,
+        before.st_mtime_ns,
+    )
+
+
+class StreamUpper(MakeUpper):
+    def transform(self, source_file, destination_file):
+        self.stream_to_output(source_file, destination_file)
+
+    def transform_stream(self, reader, writer):
+        for line in reader:
+            writer.write(line.upper())
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    ["pets", "cities"],
+)
+def test_stream_upper(test_case, tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", test_case, str(tmp_path))
+    StreamUpper(c.input, c.actual).run()
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+class StripU2029(MakeUpper):
+    def transform(self, source_file, destination_file):
+        self.map_to_output(source_file, destination_file)
+
+    def transform_bytes(self, data):
+        if data.find(b"\xe2\x80\xa9") == -1:
+            return None
+        return data[:].replace(b"\xe2\x80\xa9", b"")
+
+
+def test_map_to_output(tmp_path):
+    i_dir = tmp_path / "in"
+    i_dir.mkdir()
+    (i_dir / "clean.txt").write_bytes(b"clean\n")
+    (i_dir / "dirty.txt").write_bytes(b"dir\xe2\x80\xa9ty\n")
+    StripU2029(str(i_dir), str(tmp_path / "out")).run()
+    assert (tmp_path / "out" / "clean.txt").read_bytes() == b"clean\n"
+    assert (tmp_path / "out" / "dirty.txt").read_bytes() == b"dirty\n"
+
+    # in place only rewrites the file that changed
+    (i_dir / "dirty.txt").write_bytes(b"dir\xe2\x80\xa9ty\n")
+    clean_before = os.stat(str(i_dir / "clean.txt")).st_ino
+    StripU2029(str(i_dir), str(i_dir)).run()
+    assert (i_dir / "dirty.txt").read_bytes() == b"dirty\n"
+    assert os.stat(str(i_dir / "clean.txt")).st_ino == clean_before
+
+
+@pytest.mark.parametrize("durability", ["none", "file", "batch"])
+def test_durability(durability, tmp_path, testdata):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = HelperUpper(c.input, c.actual)
+    m.atomic_writes = True
+    m.durability = durability
+    m.run()
+    assert m._unsynced == []
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+
+
+def test_write_string_to_output_static(tmp_path):
+    target = str(tmp_path / "a" / "b.txt")
+    Transformer.write_string_to_output("abc", target)
+    with open(target) as f:
+        assert f.read() == "abc"
+    with pytest.raises(RuntimeError, match="Expected string input"):
+        Transformer.write_string_to_output(b"abc", target)
+
+
+def test_durability_invalid():
+    with pytest.raises(RuntimeError, match="Unknown durability: always"):
+        MakeUpper(None, None, dry_run=True).durability = "always"
+
+
+@pytest.mark.parametrize(
+    "jobs,backend", [(1, "process"), (2, "process"), (2, "thread")]
+)
+def test_write_if_changed(jobs, backend, tmp_path, testdata):
+    from shutil import copytree
+
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    i_dir = str(tmp_path / "in")
+    copytree(c.input, i_dir)
+    # one of the files is already upper case
+    with open(os.path.join(i_dir, "cold_cites.txt")) as f:
+        upper = f.read().upper()
+    with open(os.path.join(i_dir, "cold_cites.txt"), "w") as f:
+        f.write(upper)
+
+    m = HelperUpper(i_dir, i_dir)
+    m.jobs = jobs
+    m.backend = backend
+    m.write_if_changed = True
+    m.run()
+    assert m.counts["changed"] == 1
+    assert m.counts["unchanged"] == 1
+
+
+@pytest.mark.parametrize(
+    "jobs,backend", [(1, "process"), (2, "process"), (2, "thread")]
+)
+def test_run_stats(jobs, backend, tmp_path, testdata):
+    import json
+
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    stats_file = str(tmp_path / "stats.json")
+    m = HelperUpper(c.input, c.actual)
+    m.jobs = jobs
+    m.backend = backend
+    m.stats_file = stats_file
+    stats = m.run()
+    assert stats is m.stats
+    assert stats.counts["files_targeted"] == 2
+    assert stats.counts["files_transformed"] == 2
+    assert stats.counts["files_scanned"] >= 2
+    size = sum(
+        os.path.getsize(os.path.join(c.input, f))
+        for f in ["cold_cites.txt", "warm_cities.txt"]
+    )
+    assert stats.counts["bytes_read"] == size
+    assert stats.counts["bytes_written"] == size
+    for phase in ["walk", "is_target", "read", "write", "transform"]:
+        assert stats.seconds[phase] > 0
+    assert stats.elapsed > 0
+    assert len(stats.slowest) == 2
+    assert stats.percentile(50) <= stats.percentile(99)
+
+    with open(stats_file) as f:
+        data = json.load(f)
+    assert data["counts"]["files_transformed"] == 2
+    assert data["files_per_second"] > 0
+
+
+def test_run_stats_bytes(tmp_path):
+    (tmp_path / "in").mkdir()
+    data = "caf\u00e9 \u00e9\n".encode("utf8")
+    (tmp_path / "in" / "a.txt").write_bytes(data)
+    stats = HelperUpper(str(tmp_path / "in"), str(tmp_path / "out")).run()
+    # bytes, not characters
+    assert stats.counts["bytes_read"] == 9
+    assert stats.counts["bytes_written"] == 9
+
+
+def test_make_output_dir(tmp_path, monkeypatch):
+    import treecrawl.utility
+
+    i_dir = tmp_path / "in"
+    for d in ["a", "a/b"]:
+        (i_dir / d).mkdir(parents=True)
+        for n in range(3):
+            (i_dir / d / "{}.txt".format(n)).write_text("x")
+    calls = []
+    mkdir_p = treecrawl.utility.mkdir_p
+
+    def counting_mkdir_p(target, is_file=False):
+        calls.append(target)
+        return mkdir_p(target, is_file=is_file)
+
+    monkeypatch.setattr(treecrawl.utility, "mkdir_p", counting_mkdir_p)
+    HelperUpper(str(i_dir), str(tmp_path / "out")).run()
+    assert len(calls) == 2
+    assert (tmp_path / "out" / "a" / "b" / "2.txt").read_text() == "X"
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    ["pets", "cities"],
+)
+def test_make_upper_manifest(
+    test_case, tmp_path, request, testdata, update_golden, golden_manifests
+):
+    """test_make_upper, compared with the session's golden manifests"""
+    c = CaseHelper(
+        testdata,
+        "test_make_upper",
+        test_case,
+        str(tmp_path),
+        update_golden=update_golden,
+        golden_manifests=golden_manifests,
+    )
+    if update_golden:
+        MakeUpper(c.input, c.golden).run()
+
+    m = MakeUpper(c.input, c.actual)
+    m.run()
+    for r in c.compare():
+        succeeded, compared = r
+        assert succeeded
+    assert not os.path.exists(c.expected)
+    assert c.golden in golden_manifests._manifests
+
+    # break the output
+    with open(os.path.join(c.actual, "johns_pets.txt"), "a") as f:
+        f.write("X")
+    for r in c.compare():
+        succeeded, compared = r
+        assert not succeeded
+
+
+def test_update_golden_staging(tmp_path, testdata):
+    """Concurrent regenerations of one case each swap in a whole golden"""
+    from concurrent.futures import ThreadPoolExecutor
+    from shutil import copytree
+
+    project = tmp_path / "testdata"
+    copytree(
+        os.path.join(testdata, "test_make_upper", "pets"),
+        str(project / "test_make_upper" / "pets"),
+    )
+
+    def regenerate(n):
+        c = CaseHelper(
+            str(project),
+            "test_make_upper",
+            "pets",
+            str(tmp_path / "tmp{}".format(n)),
+            update_golden=True,
+        )
+        assert c.golden != c.project_golden
+        MakeUpper(c.input, c.golden).run()
+        MakeUpper(c.input, c.actual).run()
+        return c.compare()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for results in executor.map(regenerate, range(8)):
+            for succeeded, compared in results:
+                assert succeeded
+    assert sorted(os.listdir(str(project / "test_make_upper" / "pets"))) == [
+        "golden",
+        "input",
+    ]
+
+
+def test_update_golden_discard(tmp_path, testdata):
+    from shutil import copytree
+
+    project = tmp_path / "testdata"
+    case_dir = project / "test_make_upper" / "pets"
+    copytree(os.path.join(testdata, "test_make_upper", "pets"), str(case_dir))
+
+    def helper():
+        return CaseHelper(
+            str(project),
+            "test_make_upper",
+            "pets",
+            str(tmp_path / "tmp"),
+            update_golden=True,
+        )
+
+    # a test that fails before compare()
+    c = helper()
+    MakeUpper(c.input, c.golden).run()
+    c.discard()
+    assert sorted(os.listdir(str(case_dir))) == ["golden", "input"]
+
+    # left behind by a worker that has exited
+    stale = case_dir / "golden.999999999.abc.staging"
+    stale.mkdir()
+    (case_dir / "golden.999999999.def.old").mkdir()
+    c = helper()
+    MakeUpper(c.input, c.golden).run()
+    MakeUpper(c.input, c.actual).run()
+    for succeeded, compared in c.compare():
+        assert succeeded
+    assert sorted(os.listdir(str(case_dir))) == ["golden", "input"]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.cli`."""
+import json
+import pytest
+from treecrawl.cli import main, unescape
+
+
+def test_unescape():
+    assert unescape("\\u2029") == "\u2029"
+    assert unescape("a\\tb") == "a\tb"
+    assert unescape("plain") == "plain"
+
+
+def test_main_in_place(tmp_path):
+    (tmp_path / "a.txt").write_text("old.example.com\u2029\n")
+    (tmp_path / "b.py").write_text("old.example.com\n")
+    stats_file = tmp_path.parent / (tmp_path.name + "-stats.json")
+    argv = [
+        "--replace",
+        "old.example.com",
+        "new.example.com",
+        "--strip",
+        "\\u2029",
+        "--case",
+        "upper",
+        "--include",
+        "*.txt",
+        "--stats-file",
+        str(stats_file),
+        str(tmp_path),
+    ]
+    assert main(argv) == 0
+    assert (tmp_path / "a.txt").read_text() == "NEW.EXAMPLE.COM\n"
+    assert (tmp_path / "b.py").read_text() == "old.example.com\n"
+    with open(str(stats_file)) as f:
+        assert json.load(f)["counts"]["changed"] == 1
+
+
+def test_main_order(tmp_path):
+    # edits apply in command line order
+    (tmp_path / "a.txt").write_text("abc\n")
+    argv = ["--case", "upper", "--regex", "[a-z]", "x", str(tmp_path)]
+    assert main(argv) == 0
+    assert (tmp_path / "a.txt").read_text() == "ABC\n"
+
+
+def test_main_dry_run_and_output(tmp_path):
+    i_dir = tmp_path / "in"
+    i_dir.mkdir()
+    (i_dir / "a.txt").write_text("a\r\n")
+    argv = ["--line-endings", "lf", "--dry-run", str(i_dir)]
+    assert main(argv) == 0
+    assert (i_dir / "a.txt").read_bytes() == b"a\r\n"
+    argv = ["--line-endings", "lf", "--jobs", "2"]
+    assert main(argv + [str(i_dir), str(tmp_path / "out")]) == 0
+    assert (tmp_path / "out" / "a.txt").read_bytes() == b"a\n"
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        [],
+        ["--jobs", "-1", "--case", "upper"],
+        ["--regex", "(", "x"],
+        ["--replace", "", "x"],
+        ["--replace-table", "/does/not/exist"],
+        ["--case", "upper", "--log-level", "LOUD"],
+    ],
+)
+def test_main_usage_errors(argv, tmp_path):
+    with pytest.raises(SystemExit) as err:
+        main(argv + [str(tmp_path)])
+    assert err.value.code == 2
+
+
+def test_main_invalid_input(tmp_path, capsys):
+    argv = ["--case", "upper", str(tmp_path / "missing")]
+    assert main(argv) == 1
+    assert "Invalid path" in capsys.readouterr().err
+
+
+def test_main_default_exclude(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("ref\n")
+    (tmp_path / "a.txt").write_text("ref\n")
+    assert main(["--case", "upper", str(tmp_path)]) == 0
+    assert (tmp_path / ".git" / "HEAD").read_text() == "ref\n"
+    assert (tmp_path / "a.txt").read_text() == "REF\n"
+    argv = ["--case", "upper", "--no-default-exclude", str(tmp_path)]
+    assert main(argv) == 0
+    assert (tmp_path / ".git" / "HEAD").read_text() == "REF\n"
+
+
+def test_main_replace_table(tmp_path):
+    table = tmp_path.parent / (tmp_path.name + "-table.tsv")
+    table.write_text("foo\tbar\nfoobar\tbaz\n")
+    (tmp_path / "a.txt").write_text("foo foobar food\n")
+    assert main(["--replace-table", str(table), str(tmp_path)]) == 0
+    assert (tmp_path / "a.txt").read_text() == "bar baz bard\n"
+    assert main(["--word-table", str(table), str(tmp_path)]) == 0
+    assert (tmp_path / "a.txt").read_text() == "bar baz bard\n"
+    (tmp_path / "a.txt").write_text("foo foobar food\n")
+    assert main(["--word-table", str(table), str(tmp_path)]) == 0
+    assert (tmp_path / "a.txt").read_text() == "bar baz food\n"
+
+
+def test_main_manifest_identity(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "a.txt").write_text("aaa bbb\n")
+    manifest = str(tmp_path / "m.json")
+    common = ["--manifest", manifest, str(tmp_path / "in")]
+    assert main(["--replace", "aaa", "AAA"] + common) == 0
+    # a different edit can't trust the last run's records
+    assert main(["--replace", "bbb", "BBB"] + common) == 0
+    assert (tmp_path / "in" / "a.txt").read_text() == "AAA BBB\n"
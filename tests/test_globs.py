@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.globs`."""
+import os
+import pytest
+from treecrawl.globs import GlobSet, translate
+from treecrawl.transformer import Transformer
+
+
+@pytest.mark.parametrize(
+    "pattern,path,expected",
+    [
+        ("*.txt", "a.txt", True),
+        ("*.txt", "x/y/a.txt", True),
+        ("*.txt", "a.txt.bak", False),
+        ("/*.txt", "x/a.txt", False),
+        ("x/*.txt", "x/a.txt", True),
+        ("x/*.txt", "x/y/a.txt", False),
+        ("x/*.txt", "z/x/a.txt", False),
+        ("x/**/*.txt", "x/a.txt", True),
+        ("x/**/*.txt", "x/y/z/a.txt", True),
+        ("**/a.txt", "a.txt", True),
+        ("**", "any/thing", True),
+        ("a?c", "abc", True),
+        ("a?c", "a/c", False),
+        ("[ab].py", "b.py", True),
+        ("[!ab].py", "b.py", False),
+        ("[!ab].py", "c.py", True),
+        ("a[b", "a[b", True),
+        ("a.b", "axb", False),
+        ("x/", "x/a.txt", True),
+        ("x/", "y/x/z/a.txt", True),
+        ("x/**", "x/y/a.txt", True),
+        ("x/**", "x", False),
+        ("x/", "x", False),
+    ],
+)
+def test_glob_set_match(pattern, path, expected):
+    assert GlobSet([pattern]).match(path) is expected
+
+
+def test_glob_set_match_dir():
+    g = GlobSet(["build/", "docs/**", "*.txt"])
+    assert g.match_dir("build")
+    assert g.match_dir("a/build")
+    assert g.match_dir("docs")
+    assert not g.match_dir("a/docs")
+    assert not g.match_dir("notes.txt")
+    assert not GlobSet([]).match("a")
+    assert not GlobSet([])
+
+
+def test_translate_dir_only():
+    assert translate("x/")[1]
+    assert translate("x/**")[1]
+    assert not translate("x/**/y")[1]
+
+
+class Globbed(Transformer):
+    include = ("*.txt", "keep/")
+    exclude = ("skip/", "*.bak.txt")
+
+    def __init__(self, input, **kwargs):
+        super().__init__(input, input, **kwargs)
+        self.dirs = []
+
+    def is_target_dir(self, i_dir):
+        self.dirs.append(os.path.basename(i_dir))
+        return super().is_target_dir(i_dir)
+
+
+def test_transformer_globs(tmp_path):
+    for f in [
+        "a.txt",
+        "a.bak.txt",
+        "a.py",
+        "sub/b.txt",
+        "sub/skip/c.txt",
+        "keep/d.py",
+    ]:
+        p = tmp_path / f
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("x")
+    t = Globbed(str(tmp_path))
+    found = sorted(
+        os.path.relpath(s, str(tmp_path)) for s, _ in t.iter_source_dest()
+    )
+    assert found == ["a.txt", "keep/d.py", "sub/b.txt"]
+    # the excluded directory is pruned before is_target_dir is asked
+    assert "skip" not in t.dirs
+    assert t.stats.counts["files_scanned"] == 5
+
+    t = Globbed(str(tmp_path), include=["**/c.txt"], exclude=[])
+    found = [os.path.basename(s) for s, _ in t.iter_source_dest()]
+    assert found == ["c.txt"]
+
+
+def test_is_target_needs_globs(tmp_path):
+    t = Transformer(str(tmp_path), str(tmp_path))
+    with pytest.raises(NotImplementedError):
+        t.is_target(str(tmp_path))
+    # exclude alone doesn't opt every other file in
+    t.exclude = ["*.bak"]
+    with pytest.raises(NotImplementedError):
+        t.is_target(str(tmp_path))
+    t.include = ["*.txt"]
+    assert t.is_target(str(tmp_path))
+
+
+def test_transformer_glob_str(tmp_path):
+    for f in ["a.py", "b.txt", "p.y", "build/c.py"]:
+        p = tmp_path / f
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("x")
+    # a str is one glob, not one glob per character
+    t = Transformer(str(tmp_path), include="*.py", exclude="build/")
+    found = [os.path.basename(s) for s, _ in t.iter_source_dest()]
+    assert found == ["a.py"]
+    t.exclude = "a.*"
+    found = [os.path.basename(s) for s, _ in t.iter_source_dest()]
+    assert found == ["c.py"]
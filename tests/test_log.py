@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.log`."""
+import logging
+import pytest
+from treecrawl import log
+from treecrawl.casehelper import CaseHelper
+from treecrawl.log import (
+    EventSampler,
+    create_module_logger,
+    start_background_logging,
+    stop_background_logging,
+)
+from treecrawl.transformer import Transformer
+
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+        self.messages = []
+
+    def emit(self, record):
+        import threading
+
+        self.threads.append(threading.current_thread().name)
+        self.messages.append(record.getMessage())
+
+
+def test_create_module_logger_idempotent():
+    ml = create_module_logger("treecrawl.test_log.idempotent")
+    create_module_logger("treecrawl.test_log.idempotent")
+    assert ml.handlers == [log.stdout_handler()]
+
+
+def test_background_logging(monkeypatch):
+    import threading
+
+    recorder = Recorder()
+    monkeypatch.setattr(log, "_stdout_handler", recorder)
+    ml = create_module_logger("treecrawl.test_log.background")
+    assert start_background_logging()
+    try:
+        assert not start_background_logging()
+        assert ml.handlers != [recorder]
+        later = create_module_logger("treecrawl.test_log.later")
+        for i in range(100):
+            ml.info("message %d", i)
+        later.info("later")
+    finally:
+        stop_background_logging()
+    # stop waits for the queue to drain
+    assert recorder.messages[:100] == ["message %d" % i for i in range(100)]
+    assert recorder.messages[-1] == "later"
+    assert threading.current_thread().name not in recorder.threads
+    assert ml.handlers == [recorder]
+    assert later.handlers == [recorder]
+    stop_background_logging()
+
+
+def test_event_sampler_every():
+    s = EventSampler(every=3)
+    assert [s.allow("a") for i in range(7)] == [
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert s.allow("b")
+
+
+def test_event_sampler_per_second(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(log, "monotonic", lambda: now[0])
+    s = EventSampler(per_second=2)
+    assert [s.allow("a") for i in range(4)] == [True, True, False, False]
+    assert s.allow("b")
+    now[0] += 1.0
+    assert s.allow("a")
+
+
+class LoggingUpper(Transformer):
+    def is_target(self, i_file):
+        return i_file.endswith(".txt")
+
+    def transform(self, source_file, destination_file):
+        self.log_file("edit", "upper casing %s", source_file)
+        if self.dry_run:
+            return
+        contents = self.read_string(source_file)
+        self.write_output(contents.upper(), destination_file)
+
+
+@pytest.mark.parametrize(
+    "jobs,backend", [(1, "process"), (2, "process"), (2, "thread")]
+)
+def test_log_file(jobs, backend, tmp_path, testdata, caplog):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = LoggingUpper(c.input, c.actual)
+    m.jobs = jobs
+    m.backend = backend
+    m.log_every = 2
+    m.log_background = True
+    with caplog.at_level(logging.INFO):
+        stats = m.run()
+    assert log._listener is None
+    if jobs == 1:
+        messages = [
+            r.getMessage() for r in caplog.records if "upper casing" in r.msg
+        ]
+        assert len(messages) == 1
+        assert messages[0].startswith(Transformer.dry_run_prefix)
+    # one worker may get both files. then the second is suppressed
+    assert stats.counts["log_suppressed"] <= 1
+    if jobs == 1 or backend == "thread":
+        assert stats.counts["log_suppressed"] == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.profiling`."""
+import logging
+import os
+import pstats
+import pytest
+from treecrawl.casehelper import CaseHelper
+from treecrawl.profiling import log_directory
+from treecrawl.transformer import Transformer
+
+
+class ProfiledUpper(Transformer):
+    def is_target(self, i_file):
+        return i_file.endswith(".txt")
+
+    def transform(self, source_file, destination_file):
+        contents = self.read_string(source_file)
+        self.write_output(contents.upper(), destination_file)
+
+
+def _run(tmp_path, testdata, profile, jobs=1, backend="process"):
+    c = CaseHelper(testdata, "test_make_upper", "cities", str(tmp_path))
+    m = ProfiledUpper(c.input, c.actual, dry_run=False)
+    m.profile = profile
+    m.profile_dir = str(tmp_path / "profile")
+    m.profile_every = 1
+    m.jobs = jobs
+    m.backend = backend
+    m.run()
+    for succeeded, _ in c.compare():
+        assert succeeded
+    return m
+
+
+def test_profile_cprofile(tmp_path, testdata):
+    m = _run(tmp_path, testdata, "cprofile")
+    assert len(m.profile_files) == 1
+    assert m.profile_files[0].endswith(".cprofile.prof")
+    stats = pstats.Stats(m.profile_files[0])
+    assert any(f[2] == "transform" for f in stats.stats)
+
+
+@pytest.mark.parametrize(
+    "jobs,backend", [(1, "process"), (2, "process"), (2, "thread")]
+)
+def test_profile_sample(jobs, backend, tmp_path, testdata):
+    m = _run(tmp_path, testdata, ["sample"], jobs, backend)
+    assert [os.path.basename(f)[-12:] for f in m.profile_files] == [
+        ".sample.prof"
+    ]
+    stats = pstats.Stats(m.profile_files[0])
+    calls = [v[1] for k, v in stats.stats.items() if k[2] == "transform"]
+    assert calls == [2]
+    # the worker files are merged
+    assert os.listdir(str(tmp_path / "profile")) == [
+        os.path.basename(m.profile_files[0])
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_profile_tracemalloc(jobs, tmp_path, testdata):
+    import tracemalloc
+
+    m = _run(tmp_path, testdata, "tracemalloc", jobs)
+    report, snapshot = m.profile_files
+    with open(report) as f:
+        text = f.read()
+    assert "top allocators" in text
+    assert "growth since the start of the run" in text
+    if jobs > 1:
+        assert "top allocators in worker" in text
+    tracemalloc.Snapshot.load(snapshot)
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_invalid():
+    t = ProfiledUpper(None, None)
+    with pytest.raises(RuntimeError, match="Unknown profile mode: heap"):
+        t.profile = "heap"
+    with pytest.raises(RuntimeError, match="can't be combined"):
+        t.profile = ["cprofile", "sample"]
+
+
+def test_log_directory(tmp_path):
+    logger = logging.getLogger("treecrawl.test_log_directory.child")
+    parent = logging.getLogger("treecrawl.test_log_directory")
+    assert log_directory(logger) == os.getcwd()
+    handler = logging.FileHandler(str(tmp_path / "run.log"))
+    parent.addHandler(handler)
+    try:
+        assert log_directory(logger) == str(tmp_path)
+    finally:
+        parent.removeHandler(handler)
+        handler.close()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.sniff`."""
+import os
+import pytest
+from treecrawl.sniff import BinarySniffer, sniff_binary
+from treecrawl.transformer import Transformer
+from treecrawl.utility import iter_file_entries
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        (b"plain text\n", False),
+        ("café  \n".encode("utf8"), False),
+        (b"", False),
+        (b"text\0with a NUL", True),
+        (b"\xff\xfelatin-1 \xe9", True),
+        ("é".encode("utf16"), True),
+    ],
+)
+def test_sniff_binary(data, expected, tmp_path):
+    f = tmp_path / "f"
+    f.write_bytes(data)
+    assert sniff_binary(str(f)) is expected
+
+
+def test_sniff_binary_truncated_character(tmp_path):
+    # a multi-byte character split by the sample isn't invalid utf-8
+    f = tmp_path / "f"
+    f.write_bytes(b"a" * 7 + "é".encode("utf8") + b"\0")
+    assert not sniff_binary(str(f), size=8)
+    assert sniff_binary(str(f), size=16)
+
+
+def test_binary_sniffer_extensions(tmp_path, monkeypatch):
+    import treecrawl.sniff
+
+    for i in range(3):
+        (tmp_path / "{}.dat".format(i)).write_bytes(b"\0")
+    (tmp_path / "3.dat").write_text("text")
+    (tmp_path / "a.png").write_text("not really a png")
+    calls = []
+
+    def counting(path, size):
+        calls.append(path)
+        return sniff_binary(path, size)
+
+    monkeypatch.setattr(treecrawl.sniff, "sniff_binary", counting)
+    s = BinarySniffer(learn_after=2)
+    assert s.is_binary(str(tmp_path / "a.png"))
+    assert s.is_binary(str(tmp_path / "0.dat"))
+    assert s.is_binary(str(tmp_path / "1.dat"))
+    # .dat is binary now
+    assert s.is_binary(str(tmp_path / "2.dat"))
+    assert s.is_binary(str(tmp_path / "3.dat"))
+    assert len(calls) == 2
+
+
+def test_binary_sniffer_text_not_learned(tmp_path):
+    for i in range(40):
+        (tmp_path / "{}.dat".format(i)).write_text("text")
+    (tmp_path / "nul.dat").write_bytes(b"text\0")
+    s = BinarySniffer(learn_after=2)
+    for i in range(40):
+        assert not s.is_binary(str(tmp_path / "{}.dat".format(i)))
+    assert s.is_binary(str(tmp_path / "nul.dat"))
+
+
+def test_binary_sniffer_mixed_extension(tmp_path):
+    (tmp_path / "a.dat").write_bytes(b"\0")
+    (tmp_path / "b.dat").write_text("text")
+    (tmp_path / "c.dat").write_bytes(b"\0")
+    (tmp_path / "d.dat").write_text("text")
+    s = BinarySniffer(learn_after=2)
+    assert [
+        s.is_binary(str(tmp_path / f))
+        for f in ["a.dat", "b.dat", "c.dat", "d.dat"]
+    ] == [True, False, True, False]
+    assert ".dat" not in s._extensions
+
+
+def test_binary_sniffer_unreadable(tmp_path):
+    os.symlink("nowhere", str(tmp_path / "dangling.txt"))
+    s = BinarySniffer()
+    assert s.is_binary(str(tmp_path / "dangling.txt"))
+    (entry,) = iter_file_entries(str(tmp_path))
+    assert s.is_binary(entry)
+
+
+def test_binary_sniffer_inodes(tmp_path, monkeypatch):
+    import treecrawl.sniff
+
+    (tmp_path / "a").write_bytes(b"\0")
+    os.link(str(tmp_path / "a"), str(tmp_path / "b"))
+    calls = []
+    monkeypatch.setattr(
+        treecrawl.sniff, "sniff_binary", lambda p, s: calls.append(p) or True
+    )
+    s = BinarySniffer()
+    entries = sorted(iter_file_entries(str(tmp_path)), key=lambda e: e.name)
+    assert s.is_binary(entries[0])
+    assert s.is_binary(entries[1])
+    assert s.is_binary(str(tmp_path / "a"))
+    assert len(calls) == 1
+
+
+class SkipBinary(Transformer):
+    def is_target(self, i_file):
+        return not self.is_binary(i_file)
+
+
+def test_is_binary_in_is_target(tmp_path):
+    (tmp_path / "a.txt").write_text("text")
+    (tmp_path / "b.txt").write_bytes(b"\0\1")
+    t = SkipBinary(str(tmp_path), str(tmp_path))
+    assert [os.path.basename(s) for s, _ in t.iter_source_dest()] == ["a.txt"]
+
+
+def test_dangling_symlink_skipped(tmp_path):
+    from treecrawl.text import MapCase, TextTransformer
+
+    (tmp_path / "a.txt").write_text("text")
+    os.symlink("nowhere", str(tmp_path / "b.txt"))
+    t = TextTransformer(str(tmp_path), edits=[MapCase("upper")], dry_run=False)
+    stats = t.run()
+    assert (tmp_path / "a.txt").read_text() == "TEXT"
+    assert stats.counts["files_binary"] == 1
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+"""Tests for `treecrawl.text`."""
+import pytest
+from treecrawl.text import (
+    LiteralReplace,
+    MapCase,
+    MultiReplace,
+    NormalizeLineEndings,
+    RegexReplace,
+    ReplaceTransformer,
+    StripChars,
+    TextTransformer,
+    load_table,
+)
+
+
+@pytest.mark.parametrize(
+    "edit,text,expected",
+    [
+        (RegexReplace(r"(\w+)@old", r"\1@new"), "a@old b@old", "a@new b@new"),
+        (LiteralReplace("a.b", "c"), "a.b axb", "c axb"),
+        (StripChars("\u2029"), "a\u2029b\u2029", "ab"),
+        (MapCase("upper"), "abc", "ABC"),
+        (MapCase("swapcase"), "aBc", "AbC"),
+        (NormalizeLineEndings("lf"), "a\r\nb\rc\n", "a\nb\nc\n"),
+        (NormalizeLineEndings("crlf"), "a\r\nb\n", "a\r\nb\r\n"),
+    ],
+)
+def test_edits(edit, text, expected):
+    assert edit.apply(text) == expected
+
+
+def test_may_change():
+    assert not LiteralReplace("x", "y").may_change(b"abc")
+    assert StripChars("\u2029").may_change("a\u2029".encode("utf8"))
+    assert not StripChars("\u2029").may_change(b"a")
+    assert not NormalizeLineEndings("lf").may_change(b"a\nb\n")
+
+
+def test_invalid_edits():
+    with pytest.raises(ValueError, match="Unknown case mode: title"):
+        MapCase("title")
+    with pytest.raises(ValueError, match="Unknown line ending: cr"):
+        NormalizeLineEndings("cr")
+    with pytest.raises(ValueError):
+        LiteralReplace("", "x")
+
+
+def _tree(tmp_path):
+    i_dir = tmp_path / "in"
+    (i_dir / "sub").mkdir(parents=True)
+    (i_dir / "a.txt").write_bytes("one\u2029two\r\n".encode("utf8"))
+    (i_dir / "sub" / "b.txt").write_bytes(b"clean\n")
+    (i_dir / "sub" / "c.md").write_bytes("md\u2029\n".encode("utf8"))
+    (i_dir / "blob.bin").write_bytes(b"\xff\xfe\xe2\x80\xa9")
+    return i_dir
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_text_transformer(jobs, tmp_path):
+    i_dir = _tree(tmp_path)
+    o_dir = tmp_path / "out"
+    t = TextTransformer(
+        str(i_dir),
+        str(o_dir),
+        edits=[StripChars("\u2029"), NormalizeLineEndings("lf")],
+        dry_run=False,
+        jobs=jobs,
+    )
+    t.exclude = ["*.md"]
+    stats = t.run()
+    assert (o_dir / "a.txt").read_bytes() == b"onetwo\n"
+    # unchanged files are copied to a separate output
+    assert (o_dir / "sub" / "b.txt").read_bytes() == b"clean\n"
+    assert not (o_dir / "sub" / "c.md").exists()
+    assert not (o_dir / "blob.bin").exists()
+    assert stats.counts["changed"] == 1
+    assert stats.counts["unchanged"] == 1
+    assert stats.counts["files_binary"] == 1
+
+
+def test_text_transformer_dry_run(tmp_path):
+    i_dir = _tree(tmp_path)
+    t = TextTransformer(str(i_dir), edits=[StripChars("\u2029")])
+    t.include = ["*.txt", "sub/*.md"]
+    stats = t.run()
+    assert stats.counts["changed"] == 2
+    assert stats.counts["unchanged"] == 1
+    contents = (i_dir / "a.txt").read_bytes()
+    assert contents == "one\u2029two\r\n".encode("utf8")
+
+
+def test_text_transformer_undecodable(tmp_path):
+    i_dir = tmp_path / "in"
+    i_dir.mkdir()
+    (i_dir / "blob.bin").write_bytes(b"\xff\xfeabc")
+    t = TextTransformer(str(i_dir), edits=[MapCase("upper")], dry_run=False)
+    t.skip_binary = False
+    stats = t.run()
+    assert stats.counts["undecodable"] == 1
+    assert (i_dir / "blob.bin").read_bytes() == b"\xff\xfeabc"
+
+
+def test_text_transformer_symlink(tmp_path):
+    import os
+
+    (tmp_path / "tgt").mkdir()
+    (tmp_path / "tgt" / "z.txt").write_text("abc\n")
+    (tmp_path / "in").mkdir()
+    link = tmp_path / "in" / "a.txt"
+    os.symlink(os.path.join("..", "tgt", "z.txt"), str(link))
+    TextTransformer(
+        str(tmp_path / "in"), edits=[MapCase("upper")], dry_run=False
+    ).run()
+    # written through the link like the baseline string_to_file
+    assert link.is_symlink()
+    assert (tmp_path / "tgt" / "z.txt").read_text() == "ABC\n"
+
+
+def test_cache_identity():
+    a = TextTransformer(None, None, edits=[LiteralReplace("a", "b")])
+    b = TextTransformer(None, None, edits=[LiteralReplace("a", "c")])
+    assert a.cache_identity() != b.cache_identity()
+
+
+def test_multi_replace_leftmost_longest():
+    m = MultiReplace({"foo": "1", "foobar": "2", "oba": "3", "fob": "4"})
+    assert m.apply("foobar foobaz fobar xoba") == "2 1baz 4ar x3"
+    # replacements aren't scanned again
+    m = MultiReplace({"a": "b", "b": "a"})
+    assert m.apply("abba") == "baab"
+
+
+def test_multi_replace_special_chars():
+    m = MultiReplace({"a.b": "x", "(": "[", "\u00e9t\u00e9": "summer"})
+    assert m.apply("a.b axb ( \u00e9t\u00e9") == "x axb [ summer"
+    assert m.may_change("\u00e9t\u00e9".encode("utf8"))
+    assert not m.may_change(b"axb")
+
+
+def test_multi_replace_whole_words():
+    m = MultiReplace({"foo": "bar"}, whole_words=True)
+    assert m.apply("foo foobar _foo foo.x") == "bar foobar _foo bar.x"
+
+
+def test_multi_replace_many_keys():
+    table = {"name{}".format(i): "renamed{}".format(i) for i in range(500)}
+    m = MultiReplace(table)
+    text = " ".join("name{}".format(i) for i in range(0, 500, 7))
+    expected = " ".join("renamed{}".format(i) for i in range(0, 500, 7))
+    assert m.apply(text) == expected
+
+
+def test_multi_replace_invalid():
+    with pytest.raises(ValueError):
+        MultiReplace({})
+    with pytest.raises(ValueError):
+        MultiReplace({"": "x"})
+
+
+def test_load_table(tmp_path):
+    path = tmp_path / "table.tsv"
+    path.write_text("# comment\nold\tnew\n\nempty\t\n")
+    assert load_table(str(path)) == {"old": "new", "empty": ""}
+    path.write_text("no tab\n")
+    with pytest.raises(ValueError, match="table.tsv:1"):
+        load_table(str(path))
+
+
+def test_replace_transformer(tmp_path):
+    (tmp_path / "a.txt").write_text("old.example.com old.example\n")
+    table = {
+        "old.example": "new.example",
+        "old.example.com": "new.example.org",
+    }
+    stats = ReplaceTransformer(str(tmp_path), None, table, dry_run=False).run()
+    assert (tmp_path / "a.txt").read_text() == (
+        "new.example.org new.example\n"
+    )
+    assert stats.counts["changed"] == 1
@@ -47,6 +47,8 @@ def test_get_all_files(
         str(tmp_path),
         update_golden=update_golden,
     )
+    # expected is copied on demand
+    c.populate_expected()
     # Execute against initial data
     res = get_all_files(c.temp_case_dir)
     assert len(res) == file_count
@@ -126,3 +128,238 @@ def test_locate_subdir():
 
     res = locate_subdir("testdata")
     assert os.path.isdir(res)
+
+
+def test_mkdir_p_concurrent(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    targets = [
+        os.path.join(str(tmp_path), "a", "b", str(i % 3), "file.txt")
+        for i in range(30)
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda t: mkdir_p(t, is_file=True), targets))
+    for t in targets:
+        assert os.path.isdir(os.path.dirname(t))
+
+
+def test_iter_file_entries(tmp_path):
+    from treecrawl.utility import iter_file_entries
+
+    mkdir_p(str(tmp_path / "a" / "b"))
+    for f in ["top.txt", "a/a.txt", "a/b/b.txt"]:
+        (tmp_path / f).write_text(f)
+    os.symlink(str(tmp_path / "a"), str(tmp_path / "link_to_a"))
+
+    entries = list(iter_file_entries(str(tmp_path)))
+    walked = []
+    for root, _, f_names in os.walk(str(tmp_path)):
+        walked.extend(os.path.join(root, f) for f in f_names)
+    assert sorted(e.path for e in entries) == sorted(walked)
+    assert len(entries) == 3
+    for e in entries:
+        assert e.is_file()
+        assert e.stat().st_size == len(e.path) - len(str(tmp_path)) - 1
+
+
+def test_iter_file_entries_listing(tmp_path):
+    from treecrawl.utility import iter_file_entries
+
+    for i in range(3):
+        (tmp_path / "{}.txt".format(i)).write_text("x")
+    names = []
+    for e in iter_file_entries(str(tmp_path)):
+        names.append(e.name)
+        # written while the directory is being crawled
+        (tmp_path / ("new-" + e.name)).write_text("x")
+    assert sorted(names) == ["0.txt", "1.txt", "2.txt"]
+
+
+def test_iter_file_entries_prune(tmp_path):
+    from treecrawl.utility import iter_file_entries
+
+    mkdir_p(str(tmp_path / ".git" / "objects"))
+    mkdir_p(str(tmp_path / "src"))
+    for f in ["top.txt", ".git/objects/x", "src/a.txt"]:
+        (tmp_path / f).write_text(f)
+    seen = []
+
+    def is_target_dir(entry):
+        seen.append(entry.name)
+        return entry.name != ".git"
+
+    entries = iter_file_entries(str(tmp_path), is_target_dir)
+    res = sorted(e.name for e in entries)
+    assert res == ["a.txt", "top.txt"]
+    # objects was never listed
+    assert sorted(seen) == [".git", "src"]
+
+
+def test_iter_file_entries_unlistable(tmp_path):
+    from shutil import rmtree
+    from treecrawl.utility import iter_file_entries
+
+    for f in ["a/a.txt", "b/b.txt", "c/c.txt"]:
+        mkdir_p(str(tmp_path / f), is_file=True)
+        (tmp_path / f).write_text(f)
+
+    def remove_b(entry):
+        if entry.name == "b":
+            # collected, but gone by the time it's listed
+            rmtree(entry.path)
+        return True
+
+    entries = iter_file_entries(str(tmp_path), remove_b)
+    assert sorted(e.name for e in entries) == ["a.txt", "c.txt"]
+
+    def deny_c(entry):
+        if entry.name == "c":
+            raise PermissionError(entry.path)
+        return True
+
+    # the hook's errors aren't mistaken for an unlistable directory
+    with pytest.raises(PermissionError):
+        list(iter_file_entries(str(tmp_path), deny_c))
+
+
+def test_open_output(tmp_path):
+    from treecrawl.utility import open_input, open_output
+
+    target = str(tmp_path / "a" / "b.txt")
+    with open_output(target) as f:
+        f.write("one\r\n")
+        assert not os.path.exists(target)
+    with pytest.raises(ValueError):
+        with open_output(target) as f:
+            f.write("two\n")
+            raise ValueError("abort")
+    with open_input(target) as f:
+        assert f.read() == "one\r\n"
+    assert os.listdir(str(tmp_path / "a")) == ["b.txt"]
+
+
+def test_open_output_symlink(tmp_path):
+    from treecrawl.utility import open_output, string_to_file
+
+    (tmp_path / "tgt").mkdir()
+    (tmp_path / "tgt" / "z.txt").write_text("old")
+    link = tmp_path / "a.txt"
+    os.symlink(os.path.join("tgt", "z.txt"), str(link))
+    with open_output(str(link)) as f:
+        f.write("new")
+    string_to_file("newer", str(link), atomic=True)
+    assert link.is_symlink()
+    assert (tmp_path / "tgt" / "z.txt").read_text() == "newer"
+    assert os.listdir(str(tmp_path / "tgt")) == ["z.txt"]
+
+
+def test_map_file(tmp_path):
+    import re
+    from treecrawl.utility import map_file
+
+    f = tmp_path / "a.bin"
+    f.write_bytes(b"abc\x00def\xe2\x80\xa9")
+    with map_file(str(f)) as m:
+        assert m.find(b"\x00") == 3
+        assert re.search(b"\xe2\x80\xa9", m).start() == 7
+    (tmp_path / "empty").write_bytes(b"")
+    with map_file(str(tmp_path / "empty")) as m:
+        assert len(m) == 0
+
+
+@pytest.mark.parametrize("atomic", [False, True])
+def test_string_to_file(atomic, tmp_path):
+    from treecrawl.utility import file_to_string, fsync_paths, string_to_file
+
+    target = str(tmp_path / "a.txt")
+    string_to_file("old", target)
+    os.chmod(target, 0o750)
+    string_to_file("new", target, atomic=atomic, fsync=True)
+    assert file_to_string(target) == "new"
+    assert os.stat(target).st_mode & 0o777 == 0o750
+    assert os.listdir(str(tmp_path)) == ["a.txt"]
+    fsync_paths([target])
+
+
+def test_string_to_file_only_if_changed(tmp_path):
+    from treecrawl.utility import file_has_contents, string_to_file
+
+    target = str(tmp_path / "a.txt")
+    assert string_to_file("same\n", target, only_if_changed=True)
+    os.utime(target, ns=(0, 0))
+    assert not string_to_file("same\n", target, only_if_changed=True)
+    assert os.stat(target).st_mtime_ns == 0
+    assert string_to_file("diff\n", target, only_if_changed=True)
+    assert file_has_contents(target, b"diff\n")
+    assert not file_has_contents(target, b"diff")
+    assert not file_has_contents(str(tmp_path / "missing"), b"")
+
+
+def test_same_file_contents(tmp_path):
+    from treecrawl.utility import same_file_contents
+
+    (tmp_path / "a").write_text("same")
+    (tmp_path / "b").write_text("same")
+    (tmp_path / "c").write_text("diff")
+    (tmp_path / "d").write_text("longer")
+    assert same_file_contents(str(tmp_path / "a"), str(tmp_path / "b"))
+    assert not same_file_contents(str(tmp_path / "a"), str(tmp_path / "c"))
+    assert not same_file_contents(str(tmp_path / "a"), str(tmp_path / "d"))
+    assert not same_file_contents(str(tmp_path / "a"), str(tmp_path / "x"))
+
+
+@pytest.mark.parametrize("jobs", [1, None])
+def test_diff_directories(jobs, tmp_path):
+    from treecrawl.utility import compare_directories, diff_directories
+
+    files = {
+        "same.txt": ("abc", "abc"),
+        "sub/same_size.txt": ("abc", "abd"),
+        "sub/size.txt": ("abc", "abcd"),
+        "left_only.txt": ("x", None),
+        "sub/deeper/right_only.txt": (None, "y"),
+    }
+    for rel, contents in files.items():
+        for side, c in zip(["l", "r"], contents):
+            if c is not None:
+                p = tmp_path / side / rel
+                mkdir_p(str(p), is_file=True)
+                p.write_text(c)
+
+    left, right = str(tmp_path / "l"), str(tmp_path / "r")
+    res = diff_directories(left, right, jobs=jobs)
+    assert res.missing == ["sub/deeper/right_only.txt"]
+    assert res.extra == ["left_only.txt"]
+    assert res.different == ["sub/same_size.txt", "sub/size.txt"]
+    assert not res.identical
+    assert not compare_directories(left, right)
+    assert diff_directories(left, left, jobs=jobs).identical
+
+    first = diff_directories(left, right, jobs=jobs, stop_on_first=True)
+    assert not first.identical
+
+
+@pytest.mark.parametrize("hardlink", [False, True])
+def test_copy_tree(hardlink, tmp_path):
+    from treecrawl.utility import copy_tree, diff_directories
+
+    src = tmp_path / "src"
+    (src / "a" / "empty").mkdir(parents=True)
+    (src / "a" / "f.txt").write_text("f")
+    (src / "g.txt").write_text("g" * 100000)
+    os.chmod(str(src / "g.txt"), 0o640)
+    dst = tmp_path / "dst"
+    copy_tree(str(src), str(dst), hardlink=hardlink)
+    assert diff_directories(str(src), str(dst)).identical
+    assert (dst / "a" / "empty").is_dir()
+    assert os.stat(str(dst / "g.txt")).st_mode & 0o777 == 0o640
+    linked = (
+        os.stat(str(dst / "g.txt")).st_ino
+        == os.stat(str(src / "g.txt")).st_ino
+    )
+    assert linked == hardlink
+
+    # copying again replaces links instead of writing through them
+    copy_tree(str(src), str(dst))
+    (dst / "g.txt").write_text("changed")
+    assert (src / "g.txt").read_text() == "g" * 100000
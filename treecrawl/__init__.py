@@ -6,20 +6,57 @@ __version__ = "0.1.24"
 
 
 from .transformer import Transformer
-from .casehelper import CaseHelper
+from .asynctransformer import AsyncTransformer
+from .casehelper import CaseHelper, GoldenManifests
+from .globs import GlobSet
+from .sniff import BinarySniffer, sniff_binary
+from .stats import FileStats, RunStats
+from .text import (
+    Edit,
+    LiteralReplace,
+    MapCase,
+    MultiReplace,
+    NormalizeLineEndings,
+    RegexReplace,
+    ReplaceTransformer,
+    StripChars,
+    TextTransformer,
+    load_table,
+)
+from .log import (
+    EventSampler,
+    start_background_logging,
+    stop_background_logging,
+)
 from .utility import (
     create_module_logger,
     compare_directories,
+    copy_file,
+    copy_tree,
+    diff_directories,
+    diff_manifest,
+    file_digest,
+    tree_manifest,
+    DirectoryDiff,
+    file_lock,
     file_to_string,
+    file_has_contents,
+    same_file_contents,
+    fsync_paths,
     file_name_from_path,
     output_file_from_input_file,
     locate_subdir,
     find_path_to_ancestor,
     find_path_to_subdirectory,
+    map_file,
     mkdir_p,
+    open_input,
+    open_output,
     string_to_file,
     string_to_log_level,
     get_all_files,
+    iter_all_files,
+    iter_file_entries,
     strip_prefix,
     strip_suffix,
     validate_path,
@@ -27,16 +64,52 @@ from .utility import (
 
 __all__ = (
     "Transformer",
+    "AsyncTransformer",
     "CaseHelper",
+    "GoldenManifests",
+    "FileStats",
+    "RunStats",
+    "GlobSet",
+    "BinarySniffer",
+    "sniff_binary",
+    "Edit",
+    "LiteralReplace",
+    "MapCase",
+    "MultiReplace",
+    "NormalizeLineEndings",
+    "RegexReplace",
+    "ReplaceTransformer",
+    "StripChars",
+    "TextTransformer",
+    "load_table",
+    "EventSampler",
+    "start_background_logging",
+    "stop_background_logging",
     "create_module_logger",
     "compare_directories",
+    "copy_file",
+    "copy_tree",
+    "diff_directories",
+    "diff_manifest",
+    "file_digest",
+    "tree_manifest",
+    "DirectoryDiff",
+    "file_lock",
     "file_to_string",
+    "file_has_contents",
+    "same_file_contents",
+    "fsync_paths",
     "find_path_to_ancestor",
     "find_path_to_subdirectory",
+    "map_file",
     "mkdir_p",
+    "open_input",
+    "open_output",
     "string_to_file",
     "string_to_log_level",
     "get_all_files",
+    "iter_all_files",
+    "iter_file_entries",
     "strip_prefix",
     "strip_suffix",
     "validate_path",
@@ -0,0 +1,169 @@
+import asyncio
+import os
+from time import perf_counter
+from .stats import FileStats
+from .transformer import Transformer
+
+
+class AsyncTransformer(Transformer):
+    """Transformer with a coroutine transform driven by an event loop
+
+    Override is_target() like any other Transformer. transform() is a
+    coroutine. Use the awaitable helpers (read_string, write_output,
+    mkdir_p) for file I/O. They run the blocking syscalls in the event loop's
+    default thread pool. Anything else that can be awaited (for example
+    asyncio.create_subprocess_exec for a sidecar process) can be multiplexed
+    across files the same way.
+
+    The crawl and is_target run in the same thread pool, one file at a
+    time, so they don't block the event loop. is_target must be thread safe.
+    No more than self.max_in_flight transforms run at once (default 64).
+    jobs and backend don't apply. A file's latency in the run stats
+    includes time spent waiting for other files, and the "transform" phase
+    overlaps "read" and "write". The "sample" profile mode doesn't apply
+
+    """
+
+    default_max_in_flight = 64
+
+    async def transform(self, source_file, destination_file):
+        """Override this with transformation logic
+
+        Like Transformer.transform, but a coroutine.  CRITICAL: transform must
+        check the value of self.dry_run and do the right thing
+
+        :param str source_file: read this file as input
+        :param str destination_file: write transformed file here
+
+        """
+        raise NotImplementedError
+
+    def run(self):
+        """Transform every target on a new event loop
+
+        :rtype: RunStats
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_async())
+        finally:
+            loop.close()
+
+    async def run_async(self):
+        """Transform every target on the running event loop
+
+        Every file is attempted. Each failure is logged and a RuntimeError is
+        raised after all the transforms finish
+
+        :rtype: RunStats
+        """
+        self._start_run(open_stores=False)
+        try:
+            # the manifest and the cache are blocking file I/O too
+            await self._offload(self._open_stores)
+            await self._run_async()
+        finally:
+            try:
+                await self._offload(self._close_stores)
+            finally:
+                self._end_run(close_stores=False)
+        return self.stats
+
+    async def _run_async(self):
+        import traceback
+
+        semaphore = asyncio.Semaphore(
+            self.max_in_flight or self.default_max_in_flight
+        )
+        failed = []
+        total = 0
+
+        async def transform_one(source_file, destination_file):
+            file_stats = FileStats()
+            start = perf_counter()
+            try:
+                await self._transform_async(source_file, destination_file)
+                file_stats.latency = perf_counter() - start
+                # records the file in the manifest, which stats it
+                await self._offload(
+                    self._finished, source_file, destination_file, file_stats
+                )
+            except Exception:
+                # tasks aren't awaited one by one, so nothing may escape
+                self._failed(source_file, traceback.format_exc())
+                failed.append(source_file)
+            finally:
+                semaphore.release()
+
+        tasks = set()
+        pairs = self._iter_pairs()
+        while True:
+            # the crawl, is_target (and any sniffing) and the manifest stats
+            # block, so the generator is advanced in the thread pool
+            pair = await self._offload(next, pairs, None)
+            if pair is None:
+                break
+            k, v = pair
+            total += 1
+            # block the producer rather than queueing a task for every file
+            await semaphore.acquire()
+            task = asyncio.ensure_future(transform_one(k, v))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+        if failed:
+            raise RuntimeError(
+                "{} of {} transforms failed. first failure: {}".format(
+                    len(failed), total, failed[0]
+                )
+            )
+
+    async def _transform_async(self, source_file, destination_file):
+        """Await transform unless the output is already cached"""
+        cache = self._cache
+        if cache is None:
+            await self.transform(source_file, destination_file)
+            return
+        identity = self.cache_identity()
+        key = await self._offload(cache.key, identity, source_file)
+        if await self._offload(self._fetch_cached, key, destination_file):
+            return
+        await self.transform(source_file, destination_file)
+        if os.path.isfile(destination_file):
+            await self._offload(cache.store, key, destination_file)
+
+    @staticmethod
+    async def _offload(fn, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, fn, *args)
+
+    async def read_string(self, file_path):
+        """Awaitable Transformer.read_string
+
+        :param str file_path: absolute path to a file
+
+        :rtype: str
+        """
+        return await self._offload(super().read_string, file_path)
+
+    async def mkdir_p(self, target, is_file=False):
+        """Awaitable utility.mkdir_p
+
+        :param str target: path to a target directory or file
+        :param bool is_file: Indicates whether the target is a file
+
+        :rtype: str
+        """
+        from treecrawl.utility import mkdir_p
+
+        return await self._offload(mkdir_p, target, is_file)
+
+    async def write_output(self, s, o):
+        """Awaitable Transformer.write_output
+
+        :param str s: string data
+        :param str o: absolute path to the output file
+        """
+        await self._offload(super().write_output, s, o)
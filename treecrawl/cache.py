@@ -0,0 +1,168 @@
+"""On disk cache of transform outputs keyed by input content
+
+
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+
+class ResultCache(object):
+    """Content addressed store of transformed files
+
+    An entry is the output of a transform. Its key is a hash of the
+    transformer identity and the input file contents, so byte identical
+    inputs share one entry across runs, trees and branches.
+
+    Entries are written to a temp file and renamed into place, so several
+    processes (or build hosts sharing a directory) can use the same cache.
+    Reading an entry bumps its mtime and evict() removes the least recently
+    used entries until the cache fits in max_bytes
+
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, directory, max_bytes=1024**3):
+        """
+
+        :param str directory: cache directory. created if it doesn't exist
+        :param int max_bytes: evict() shrinks the cache to this size
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, identity, source_file):
+        """Return the cache key for transforming source_file
+
+        :param str identity: identifies the transformer and its version
+        :param str source_file: abs path to the input file
+
+        :rtype: str
+        """
+        h = hashlib.sha256(identity.encode("utf8"))
+        h.update(b"\0")
+        with open(source_file, "rb") as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(
+        self,
+        key,
+        destination_file,
+        atomic=True,
+        fsync=False,
+        only_if_changed=False,
+        make_dirs=True,
+    ):
+        """Copy a cached output to destination_file
+
+        Like utility.string_to_file, an atomic copy is written through
+        utility.open_output so destination_file is replaced atomically, and
+        with only_if_changed a destination that already matches the entry
+        isn't touched
+
+        :param str key: from ResultCache.key
+        :param str destination_file: abs path to write the output to
+        :param bool atomic: write a temp file and rename it over the
+            destination
+        :param bool fsync: flush the copy to disk before returning
+        :param bool only_if_changed: skip the write if the contents match
+        :param bool make_dirs: set False if the directory is known to exist
+
+        :rtype: Optional[bool]
+        :return: None if there's no entry for key, False if the write was
+            skipped
+        """
+        from .utility import mkdir_p, open_output, same_file_contents
+
+        entry = self._path(key)
+        try:
+            os.utime(entry)
+            src = open(entry, "rb")
+        except FileNotFoundError:
+            # evicted by another process after the utime
+            return None
+        with src:
+            if only_if_changed and same_file_contents(entry, destination_file):
+                return False
+            if atomic:
+                with open_output(
+                    destination_file,
+                    binary=True,
+                    fsync=fsync,
+                    make_dirs=make_dirs,
+                ) as writer:
+                    shutil.copyfileobj(src, writer, self.chunk_size)
+                return True
+            if make_dirs:
+                mkdir_p(destination_file, is_file=True)
+            with open(destination_file, "wb") as writer:
+                shutil.copyfileobj(src, writer, self.chunk_size)
+                if fsync:
+                    writer.flush()
+                    os.fsync(writer.fileno())
+        return True
+
+    def store(self, key, output_file):
+        """Add output_file to the cache under key
+
+        :param str key: from ResultCache.key
+        :param str output_file: abs path to a transform output
+        """
+        from .utility import mkdir_p
+
+        entry = self._path(key)
+        mkdir_p(entry, is_file=True)
+        # threads of one process can store the same key at once
+        tmp = "{}.{}.{}.tmp".format(entry, os.getpid(), threading.get_ident())
+        try:
+            shutil.copyfile(output_file, tmp)
+            os.replace(tmp, entry)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits
+
+        :rtype: int
+        :return: the number of entries removed
+        """
+        entries = []
+        total = 0
+        for root, _, f_names in os.walk(self.directory):
+            for f in f_names:
+                if f.endswith(".tmp"):
+                    # another store() is still writing it
+                    continue
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -7,6 +7,59 @@ from .utility import mkdir_p
 from typing import List, Tuple  # noqa
 
 
+def _pid_exists(pid):
+    """Return False if no process has this pid
+
+    Always True on windows, where signal 0 isn't a probe
+    """
+    if os.name == "nt" or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # someone else's process
+        return True
+    return True
+
+
+class GoldenManifests(object):
+    """Cache of golden tree manifests shared by the CaseHelpers of a session
+
+    Each golden tree is hashed once (see utility.tree_manifest) the first
+    time a case compares against it. Create one per pytest session:
+
+        @pytest.fixture(scope="session")
+        def golden_manifests():
+            return GoldenManifests()
+
+    """
+
+    def __init__(self):
+        self._manifests = {}
+
+    def get(self, golden):
+        """Return the manifest of a golden directory, hashing it if needed
+
+        :param str golden: absolute path to a golden directory
+
+        :rtype: Dict[str, Tuple[int, str]]
+        """
+        from .utility import tree_manifest
+
+        if golden not in self._manifests:
+            self._manifests[golden] = tree_manifest(golden)
+        return self._manifests[golden]
+
+    def invalidate(self, golden):
+        """Forget a golden directory that's being regenerated
+
+        :param str golden: absolute path to a golden directory
+        """
+        self._manifests.pop(golden, None)
+
+
 class CaseHelper(object):
     """Test helper object representing the test and test case data
 
@@ -23,6 +76,13 @@ class CaseHelper(object):
     project tree. This is updated when pytest is run with the -update-golden
     flag. example: testdata/[TEST]/[CASE]/output.golden
 
+    When update_golden is True, golden is a private staging directory next to
+    the real golden until compare() swaps it into place. Readers and the
+    swap lock the case (see utility.file_lock), so parallel pytest workers
+    (pytest-xdist) never see a half written or missing golden. Call
+    discard() if the test fails before compare(). Staging directories left
+    behind by processes that have exited are removed by the next swap
+
     expected(str): absolute path to a copy of the golden resource in the
     tmp/test/case used for comparison. It can be useful to keep all of the
     relevant data for a test run in one place. example:
@@ -41,7 +101,13 @@ class CaseHelper(object):
     """
 
     def __init__(
-        self, test_data, test_name, test_case, temp_dir, update_golden=False
+        self,
+        test_data,
+        test_name,
+        test_case,
+        temp_dir,
+        update_golden=False,
+        golden_manifests=None,
     ):
         """init data. see class docstring for more details
 
@@ -55,12 +121,18 @@ class CaseHelper(object):
 
         :param str temp_dir: temporary directory for the test case
 
+        :param GoldenManifests golden_manifests: session cache of golden
+        manifests. If it's given, compare() checks actual against the cached
+        manifest instead of copying and reading golden for every case
+
         if update_golden is  True
         """
         self.update_golden = update_golden
+        self.golden_manifests = golden_manifests
         self.test_name = test_name
         self.test_case = test_case
         self.golden = os.path.join(test_data, test_name, test_case, "golden")
+        self.project_golden = self.golden
         self.expected = os.path.join(
             temp_dir, test_name, test_case, "expected"
         )
@@ -68,20 +140,101 @@ class CaseHelper(object):
         self.actual = os.path.join(temp_dir, test_name, test_case, "actual")
         self.temp_case_dir = os.path.join(temp_dir, test_name, test_case)
         self.project_case_dir = os.path.join(test_data, test_name, test_case)
+        self._expected_populated = False
         # create the case path. populate will create the content subdirs
         mkdir_p(self.temp_case_dir)
 
         # if update_golden is  true, DO NOT populate temp until AFTER we use
         # the function under test to generate new golden contents
         if update_golden:
-            self._delete_golden()
+            self.golden = self._staging_path()
         else:
             self._populate_temp()
 
+    def _staging_path(self):
+        """Return a unique sibling of the project golden to write into
+
+        :rtype: str
+        """
+        import uuid
+
+        return "{}.{}.{}.staging".format(
+            self.project_golden, os.getpid(), uuid.uuid4().hex
+        )
+
+    def discard(self):
+        """Remove the staging directory of a golden that won't be swapped in
+
+        Does nothing unless update_golden is True and compare() hasn't
+        swapped the staged golden in yet
+        """
+        from shutil import rmtree
+
+        if self.golden != self.project_golden:
+            rmtree(self.golden, ignore_errors=True)
+
+    def _sweep_staging(self):
+        """Remove staging and old golden directories whose process has exited
+
+        Call with the case locked
+        """
+        from shutil import rmtree
+
+        parent, name = os.path.split(self.project_golden)
+        for f in os.listdir(parent):
+            # see _staging_path
+            parts = f.rsplit(".", 3)
+            if len(parts) != 4 or parts[0] != name:
+                continue
+            if parts[3] not in ("staging", "old"):
+                continue
+            try:
+                pid = int(parts[1])
+            except ValueError:
+                continue
+            if not _pid_exists(pid):
+                rmtree(os.path.join(parent, f), ignore_errors=True)
+
+    def _swap_golden(self):
+        """Replace the project golden with the staged one
+
+        The old golden is renamed out of the way and deleted after the new
+        one is in place. The case is locked for the swap so readers never
+        see the gap between the renames. If the process dies before the
+        delete, the next swap of the case sweeps the old copy
+        """
+        from shutil import rmtree
+        from .utility import file_lock
+
+        staging = self.golden
+        if staging == self.project_golden:
+            return
+        self._check_golden()
+        old = staging[: -len(".staging")] + ".old"
+        with file_lock(self.project_golden):
+            try:
+                os.rename(self.project_golden, old)
+            except FileNotFoundError:
+                old = None
+            os.rename(staging, self.project_golden)
+            self._sweep_staging()
+        self.golden = self.project_golden
+        if old is not None:
+            rmtree(old)
+
     def _populate_temp(self):
-        """Copy test data to temp"""
-        from distutils.dir_util import copy_tree
+        """Copy test data to temp
 
+        The expected copy is deferred until compare() needs it. see
+        populate_expected
+        """
+        from .utility import copy_tree, file_lock
+
+        with file_lock(self.golden, shared=True):
+            self._check_golden()
+        copy_tree(self.input, os.path.join(self.temp_case_dir, "input"))
+
+    def _check_golden(self):
         if not os.path.isdir(self.golden):
             msg = (
                 "Golden is missing: {}. Are you running with "
@@ -89,8 +242,21 @@ class CaseHelper(object):
                 "the new golden?".format(self.golden)
             )
             raise RuntimeError(msg)
-        copy_tree(self.input, os.path.join(self.temp_case_dir, "input"))
-        copy_tree(self.golden, self.expected)
+
+    def populate_expected(self):
+        """Copy golden to expected if it hasn't been copied yet
+
+        expected is only read, so the files are hard linked to golden when
+        they're on the same filesystem. Don't modify expected
+        """
+        from .utility import copy_tree, file_lock
+
+        if self._expected_populated:
+            return
+        with file_lock(self.golden, shared=True):
+            self._check_golden()
+            copy_tree(self.golden, self.expected, hardlink=True)
+        self._expected_populated = True
 
     def _compare_use_filecmp(self):
         """use filecmp to compare actual and expected
@@ -116,22 +282,20 @@ class CaseHelper(object):
             raise RuntimeError("Expected path to file or directory.")
         return res
 
-    def _delete_golden(self):
-        """
+    def _compare_use_manifest(self):
+        """compare actual to the cached manifest of golden
 
+        Only the actual tree is read
 
-
-        :param str output_string: log string to process
-
-        :rtype: List[Dict[str, str]]
+        :rtype: bool, Tuple[str, str, str]
         """
-        from shutil import rmtree
+        from treecrawl.utility import diff_manifest, file_lock
 
-        try:
-            rmtree(self.golden)
-        except FileNotFoundError:
-            # don't care if it doesn;t exist
-            pass
+        with file_lock(self.golden, shared=True):
+            self._check_golden()
+            manifest = self.golden_manifests.get(self.golden)
+        succeeded = diff_manifest(self.actual, manifest).identical
+        return succeeded, (self.input, self.actual, self.golden)
 
     def compare(self):
         """Run all comparisons
@@ -145,7 +309,14 @@ class CaseHelper(object):
         :rtype: List[Dict[str, str]]
         """
         if self.update_golden:
+            self._swap_golden()
             self._populate_temp()
+            if self.golden_manifests is not None:
+                self.golden_manifests.invalidate(self.golden)
         results = []
+        if self.golden_manifests is not None and os.path.isdir(self.input):
+            results.append(self._compare_use_manifest())
+            return results
+        self.populate_expected()
         results.append(self._compare_use_filecmp())
         return results
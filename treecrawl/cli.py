@@ -0,0 +1,254 @@
+"""treecrawl command line
+
+    treecrawl --strip '\\u2029' --include '*.txt' docs
+    treecrawl --replace old.example.com new.example.com --jobs 0 src out
+
+The edits are applied in the order they're given. Without an output
+directory the input files are edited in place. see treecrawl --help
+"""
+import argparse
+import os
+import re
+import sys
+
+from .text import (
+    LiteralReplace,
+    MapCase,
+    MultiReplace,
+    NormalizeLineEndings,
+    RegexReplace,
+    StripChars,
+    TextTransformer,
+    load_table,
+)
+from .transformer import Transformer
+from .utility import string_to_log_level
+
+# version control metadata is never edited unless asked for
+DEFAULT_EXCLUDE = (".git/", ".hg/", ".svn/")
+
+
+def unescape(s):
+    """Expand backslash escapes like \\u2029 and \\t in a command line value
+
+    :param str s: command line value
+
+    :rtype: str
+    """
+    return s.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+
+def _log_level(s):
+    try:
+        string_to_log_level(s)
+    except KeyError:
+        raise argparse.ArgumentTypeError("unknown log level: {}".format(s))
+    return s
+
+
+class _AppendEdit(argparse.Action):
+    """Collect the edits in one list, in command line order"""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        edits = getattr(namespace, self.dest) or []
+        try:
+            edits.append(self.const(values))
+        except (OSError, ValueError, re.error) as err:
+            parser.error("{}: {}".format(option_string, err))
+        setattr(namespace, self.dest, edits)
+
+
+def make_parser():
+    """Return the command line parser
+
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog="treecrawl",
+        description="Apply text edits to every file in a directory tree. "
+        "Files are edited IN PLACE unless an output directory or --dry-run "
+        "is given. {} are never crawled unless --no-default-exclude is "
+        "given".format(", ".join(DEFAULT_EXCLUDE)),
+    )
+    parser.add_argument("input", help="input file or directory")
+    parser.add_argument(
+        "output",
+        nargs="?",
+        help="output file or directory. default: edit input in place",
+    )
+
+    edits = parser.add_argument_group("edits, applied in the order given")
+    edits.add_argument(
+        "--regex",
+        nargs=2,
+        metavar=("PATTERN", "REPL"),
+        dest="edits",
+        action=_AppendEdit,
+        const=lambda v: RegexReplace(v[0], v[1]),
+        help="replace regular expression matches (python re syntax)",
+    )
+    edits.add_argument(
+        "--replace",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        dest="edits",
+        action=_AppendEdit,
+        const=lambda v: LiteralReplace(unescape(v[0]), unescape(v[1])),
+        help="replace literal text. backslash escapes are expanded",
+    )
+    edits.add_argument(
+        "--replace-table",
+        metavar="FILE",
+        dest="edits",
+        action=_AppendEdit,
+        const=lambda v: MultiReplace(load_table(v)),
+        help="replace every OLD with NEW in one pass. FILE has one "
+        "tab separated OLD NEW per line. the longest match wins",
+    )
+    edits.add_argument(
+        "--word-table",
+        metavar="FILE",
+        dest="edits",
+        action=_AppendEdit,
+        const=lambda v: MultiReplace(load_table(v), whole_words=True),
+        help="like --replace-table, but only whole words are replaced",
+    )
+    edits.add_argument(
+        "--strip",
+        metavar="CHARS",
+        dest="edits",
+        action=_AppendEdit,
+        const=lambda v: StripChars(unescape(v)),
+        help="remove these characters, e.g. '\\u2029'",
+    )
+    edits.add_argument(
+        "--case",
+        choices=MapCase.modes,
+        dest="edits",
+        action=_AppendEdit,
+        const=MapCase,
+        help="change the case of the text",
+    )
+    edits.add_argument(
+        "--line-endings",
+        choices=sorted(NormalizeLineEndings.endings),
+        dest="edits",
+        action=_AppendEdit,
+        const=NormalizeLineEndings,
+        help="convert every line ending to this style",
+    )
+
+    targets = parser.add_argument_group("targeting")
+    targets.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="only edit files whose path relative to input matches. "
+        "'**' matches any number of directories, a trailing '/' matches "
+        "everything in a directory. can be repeated",
+    )
+    targets.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="skip files whose relative path matches. directory patterns "
+        "like 'build/' aren't crawled at all. can be repeated",
+    )
+    targets.add_argument(
+        "--no-default-exclude",
+        action="store_true",
+        help="also edit files under {}".format(", ".join(DEFAULT_EXCLUDE)),
+    )
+
+    run = parser.add_argument_group("running")
+    run.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="log the files that would change without writing anything",
+    )
+    run.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="parallel transforms. 0 uses every core. default: 1",
+    )
+    run.add_argument(
+        "--backend", choices=Transformer.backends, default="process"
+    )
+    run.add_argument(
+        "--manifest",
+        metavar="PATH",
+        help="skip files unchanged since the last run with this manifest",
+    )
+    run.add_argument(
+        "--full",
+        action="store_true",
+        help="edit every file even if the manifest says it's current",
+    )
+    run.add_argument("--cache-dir", help="reuse outputs cached here")
+    run.add_argument(
+        "--durability", choices=Transformer.durabilities, default="none"
+    )
+    run.add_argument("--stats-file", help="write the run stats here as JSON")
+    run.add_argument("--log-level", type=_log_level, default="INFO")
+    run.add_argument(
+        "--log-every",
+        type=int,
+        default=1,
+        metavar="N",
+        help="log only every Nth per file message",
+    )
+    return parser
+
+
+def main(argv=None):
+    """Run the treecrawl command
+
+    :param List[str] argv: arguments. default: sys.argv[1:]
+
+    :rtype: int
+    :return: exit status
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if not args.edits:
+        parser.error("give at least one edit")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or more")
+
+    output = args.output
+    if output is not None:
+        output = os.path.abspath(output)
+    exclude = args.exclude
+    if not args.no_default_exclude:
+        exclude = list(DEFAULT_EXCLUDE) + exclude
+    try:
+        t = TextTransformer(
+            os.path.abspath(args.input),
+            output,
+            edits=args.edits,
+            include=args.include,
+            exclude=exclude,
+            log_level=args.log_level,
+            dry_run=args.dry_run,
+            jobs=args.jobs or None,
+            backend=args.backend,
+            manifest=args.manifest,
+            full=args.full,
+            cache_dir=args.cache_dir,
+            durability=args.durability,
+            stats_file=args.stats_file,
+            log_every=args.log_every,
+            log_background=True,
+        )
+        t.run()
+    except RuntimeError as err:
+        print("treecrawl: {}".format(err), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Glob patterns compiled into one regex
+
+
+"""
+import re
+
+
+def _segment(part):
+    """Translate the glob for one path segment. No "/" in part
+
+    :rtype: str
+    """
+    res = []
+    i, n = 0, len(part)
+    while i < n:
+        c = part[i]
+        i += 1
+        if c == "*":
+            res.append("[^/]*")
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and part[j] in "!^":
+                j += 1
+            if j < n and part[j] == "]":
+                j += 1
+            while j < n and part[j] != "]":
+                j += 1
+            if j >= n:
+                # no closing bracket. match it literally
+                res.append("\\[")
+                continue
+            body = part[i:j].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            res.append("[{}]".format(body))
+            i = j + 1
+        else:
+            res.append(re.escape(c))
+    return "".join(res)
+
+
+def translate(pattern):
+    """Translate a glob into a regex for "/" separated relative paths
+
+    "*" and "?" don't match "/". "**" as a whole segment matches any number
+    of directories. A pattern with no "/" (except a trailing one) matches at
+    any depth, otherwise it's anchored to the root. A trailing "/" or "/**"
+    makes the pattern directory-only
+
+    :param str pattern: glob, e.g. "src/**/*.py", "*.txt" or "build/"
+
+    :rtype: Tuple[str, bool]
+    :return: the regex and whether the pattern is directory-only
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    if pattern.endswith("/**") and pattern != "/**":
+        dir_only = True
+        pattern = pattern[:-3]
+    parts = pattern.lstrip("/").split("/")
+    res = []
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            res.append(".*" if last else "(?:[^/]+/)*")
+        else:
+            res.append(_segment(part) + ("" if last else "/"))
+    regex = "".join(res)
+    if not anchored:
+        regex = "(?:[^/]+/)*" + regex
+    return regex, dir_only
+
+
+def _compile(alternatives):
+    if not alternatives:
+        return None
+    return re.compile("|".join("(?:{})".format(a) for a in alternatives))
+
+
+class GlobSet(object):
+    """A list of globs matched with one regex
+
+    Directory-only patterns match the directory itself (see match_dir) and
+    every file under it. see translate for the pattern syntax
+
+    """
+
+    def __init__(self, patterns):
+        """
+
+        :param Iterable[str] patterns: globs
+        """
+        self.patterns = tuple(patterns)
+        files, dirs = [], []
+        for p in self.patterns:
+            regex, dir_only = translate(p)
+            if dir_only:
+                dirs.append(regex)
+                files.append(regex + "/.*")
+            else:
+                files.append(regex)
+        self._files = _compile(files)
+        self._dirs = _compile(dirs)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def match(self, rel_path):
+        """Return True if a file matches any of the patterns
+
+        :param str rel_path: "/" separated path relative to the root
+
+        :rtype: bool
+        """
+        return self._files is not None and bool(
+            self._files.fullmatch(rel_path)
+        )
+
+    def match_dir(self, rel_path):
+        """Return True if a directory matches a directory-only pattern
+
+        :param str rel_path: "/" separated path relative to the root
+
+        :rtype: bool
+        """
+        return self._dirs is not None and bool(self._dirs.fullmatch(rel_path))
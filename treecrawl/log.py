@@ -0,0 +1,168 @@
+"""Logging shared by the treecrawl modules
+
+
+"""
+import atexit
+import logging
+import sys
+import threading
+from collections import Counter
+from time import monotonic
+
+_lock = threading.Lock()
+# names of the loggers set up by create_module_logger
+_module_loggers = set()
+_stdout_handler = None
+_queue_handler = None
+_listener = None
+
+
+def stdout_handler():
+    """Return the stdout handler shared by the module loggers
+
+    :rtype: logging.Handler
+    """
+    global _stdout_handler
+    with _lock:
+        if _stdout_handler is None:
+            _stdout_handler = logging.StreamHandler(sys.stdout)
+            _stdout_handler.setFormatter(
+                logging.Formatter(
+                    "%(asctime)s - {%(name)s} - "
+                    "{%(filename)s:%(funcName)s:%(lineno)d} - "
+                    "%(levelname)s - %(message)s"
+                )
+            )
+        return _stdout_handler
+
+
+def _module_handler():
+    # the queue handler while background logging is on
+    return _queue_handler or stdout_handler()
+
+
+def create_module_logger(mn):
+    """Return the logger mn with the shared treecrawl handler
+
+    Calling it again for the same name doesn't add another handler
+
+    :param str mn: logger name
+
+    :rtype: logging.Logger
+    """
+    ml = logging.getLogger(mn)
+    ml.setLevel(logging.INFO)
+    handler = _module_handler()
+    with _lock:
+        _module_loggers.add(mn)
+        if handler not in ml.handlers:
+            ml.addHandler(handler)
+    return ml
+
+
+def _swap_module_handlers(old, new):
+    for name in _module_loggers:
+        ml = logging.getLogger(name)
+        if old in ml.handlers:
+            ml.removeHandler(old)
+        if new not in ml.handlers:
+            ml.addHandler(new)
+
+
+def start_background_logging():
+    """Write the module loggers' records from a background thread
+
+    The loggers put records on a queue and a listener thread writes them to
+    stdout, so a slow terminal doesn't block the threads doing file I/O.
+    Does nothing if it's already on
+
+    :rtype: bool
+    :return: False if background logging was already on
+    """
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+
+    global _queue_handler, _listener
+    stdout = stdout_handler()
+    with _lock:
+        if _listener is not None:
+            return False
+        q = queue.Queue()
+        _queue_handler = QueueHandler(q)
+        _listener = QueueListener(q, stdout, respect_handler_level=True)
+        _listener.start()
+        _swap_module_handlers(stdout, _queue_handler)
+    return True
+
+
+def stop_background_logging():
+    """Write any queued records and log from the calling thread again"""
+    global _queue_handler, _listener
+    stdout = stdout_handler()
+    with _lock:
+        if _listener is None:
+            return
+        _swap_module_handlers(_queue_handler, stdout)
+        listener, _listener, _queue_handler = _listener, None, None
+    # stop() waits for the queue to drain
+    listener.stop()
+
+
+atexit.register(stop_background_logging)
+
+
+class EventSampler(object):
+    """Decide which of many similar log messages are worth writing
+
+    Messages are grouped by event name. Only the first and then every Nth
+    message of an event is allowed, and no more than per_second of them in
+    any one second. Safe to share between threads
+
+    """
+
+    def __init__(self, every=1, per_second=None):
+        """
+
+        :param int every: allow every Nth message of an event
+        :param Optional[float] per_second: rate limit per event
+        """
+        self.every = every
+        self.per_second = per_second
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._seen = Counter()
+        # event: [window start, messages allowed in the window]
+        self._windows = {}
+
+    def __getstate__(self):
+        # process workers get a fresh sampler
+        return {"every": self.every, "per_second": self.per_second}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def allow(self, event):
+        """Return True if the next message of event should be written
+
+        :param str event: event name
+
+        :rtype: bool
+        """
+        with self._lock:
+            n = self._seen[event]
+            self._seen[event] += 1
+            if self.every > 1 and n % self.every:
+                return False
+            if self.per_second is None:
+                return True
+            now = monotonic()
+            window = self._windows.get(event)
+            if window is None or now - window[0] >= 1.0:
+                window = self._windows[event] = [now, 0]
+            if window[1] >= self.per_second:
+                return False
+            window[1] += 1
+            return True
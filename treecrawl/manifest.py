@@ -0,0 +1,104 @@
+"""Record of what a previous run transformed
+
+
+"""
+import json
+import os
+
+
+class Manifest(object):
+    """Input file metadata from the last run, used to skip unchanged files
+
+    The manifest is a JSON file mapping each transformed input file to its
+    size, mtime_ns and output file. A file is current if its size and mtime
+    haven't changed and its output still exists. The manifest also records
+    the transformer identity (see Transformer.cache_identity). A run with a
+    different identity ignores the previous records, since every output
+    would change.
+
+    Only files recorded during the current run are saved, so inputs that were
+    deleted or are no longer targeted drop out of the manifest
+
+    """
+
+    version = 1
+
+    def __init__(self, path, identity=None):
+        """
+
+        :param str path: manifest file. It doesn't have to exist yet
+        :param str identity: identifies the transform that wrote the outputs
+        """
+        self.path = path
+        self.identity = identity
+        self.previous = {}
+        self.current = {}
+        self.load()
+
+    def load(self):
+        """Read the previous run's records if there are any"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        if data.get("version") != Manifest.version:
+            return
+        if data.get("identity") != self.identity:
+            return
+        self.previous = data["files"]
+
+    def is_current(self, source_file, destination_file):
+        """Return True if source_file hasn't changed since it was recorded
+
+        Current files are carried forward into the next manifest
+
+        :param str source_file: abs path to the input file
+        :param str destination_file: abs path to the output file
+
+        :rtype: bool
+        """
+        old = self.previous.get(source_file)
+        if old is None or old[2] != destination_file:
+            return False
+        try:
+            st = os.stat(source_file)
+        except FileNotFoundError:
+            return False
+        if [st.st_size, st.st_mtime_ns] != old[:2]:
+            return False
+        if not os.path.exists(destination_file):
+            return False
+        self.current[source_file] = old
+        return True
+
+    def record(self, source_file, destination_file):
+        """Record a file that was just transformed
+
+        The input is stated after the transform so in place edits are
+        recorded with their new size and mtime
+
+        :param str source_file: abs path to the input file
+        :param str destination_file: abs path to the output file
+        """
+        st = os.stat(source_file)
+        self.current[source_file] = [
+            st.st_size,
+            st.st_mtime_ns,
+            destination_file,
+        ]
+
+    def save(self):
+        """Replace the manifest file with the current run's records"""
+        from .utility import mkdir_p
+
+        mkdir_p(self.path, is_file=True)
+        tmp = self.path + ".tmp"
+        data = {
+            "version": Manifest.version,
+            "identity": self.identity,
+            "files": self.current,
+        }
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,248 @@
+"""Opt-in profiling of a Transformer run
+
+
+"""
+import glob
+import os
+import threading
+
+# see Transformer.profile
+modes = ("cprofile", "tracemalloc", "sample")
+
+
+def log_directory(logger):
+    """Return the directory of the first file the logger writes to
+
+    Handlers of the ancestor loggers count too. Falls back to the current
+    directory when nothing is logged to a file
+
+    :param logging.Logger logger: a logger
+
+    :rtype: str
+    """
+    while logger is not None:
+        for h in logger.handlers:
+            path = getattr(h, "baseFilename", None)
+            if path and path != os.devnull:
+                return os.path.dirname(os.path.abspath(path))
+        if not logger.propagate:
+            break
+        logger = logger.parent
+    return os.getcwd()
+
+
+class RunProfiler(object):
+    """Profile a run in one or more modes
+
+    "cprofile": the whole run in the calling process. With a pool backend
+    that's the walk and the scheduling, the transforms run elsewhere
+
+    "tracemalloc": trace allocations from the start of the run. stop()
+    writes the top allocators and the growth since the start. Process
+    workers trace too and save a snapshot after every chunk
+
+    "sample": cProfile only every Nth transform call. Every thread and
+    worker process takes part. Sampled calls are serialized, a profiler can
+    only be active in one thread at a time
+
+    The files are named <directory>/<prefix>.<mode>... and stop() returns
+    their paths
+
+    """
+
+    # number of allocators listed per section of the tracemalloc report
+    top = 25
+
+    def __init__(self, modes, directory, prefix, every=100):
+        """
+
+        :param Tuple[str] modes: from profiling.modes
+        :param str directory: the output files go here
+        :param str prefix: base name of the output files
+        :param int every: sample every Nth transform call
+        """
+        self.modes = tuple(modes)
+        self.directory = directory
+        self.prefix = prefix
+        self.every = every
+        self._worker = False
+        self._reset()
+
+    def _reset(self):
+        self._calls = 0
+        self._lock = threading.Lock()
+        self._sample_lock = threading.Lock()
+        self._sample = None
+        self._profile = None
+        self._started_tracing = False
+        self._first_snapshot = None
+
+    def __getstate__(self):
+        # process workers get a fresh profiler
+        state = self.__dict__.copy()
+        for k in [
+            "_calls",
+            "_lock",
+            "_sample_lock",
+            "_sample",
+            "_profile",
+            "_started_tracing",
+            "_first_snapshot",
+        ]:
+            del state[k]
+        state["_worker"] = True
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def for_worker(self):
+        """Return a fresh profiler for a pool worker process
+
+        A forked worker inherits the parent's profiler, including an enabled
+        cProfile. That one is disabled in the worker
+
+        :rtype: RunProfiler
+        """
+        if self._profile is not None:
+            self._profile.disable()
+        res = RunProfiler.__new__(RunProfiler)
+        res.__setstate__(self.__getstate__())
+        return res
+
+    def _path(self, suffix):
+        return os.path.join(
+            self.directory, "{}.{}".format(self.prefix, suffix)
+        )
+
+    def start(self):
+        """Start profiling. Call it in the process running the transforms"""
+        from .utility import mkdir_p
+
+        mkdir_p(self.directory)
+        if "tracemalloc" in self.modes:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if not self._worker:
+                self._first_snapshot = tracemalloc.take_snapshot()
+        if "cprofile" in self.modes and not self._worker:
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def call(self, fn, *args):
+        """Call fn(*args), profiling every Nth call in "sample" mode"""
+        if "sample" not in self.modes:
+            return fn(*args)
+        with self._lock:
+            sampled = self._calls % self.every == 0
+            self._calls += 1
+        if not sampled:
+            return fn(*args)
+        import cProfile
+
+        with self._sample_lock:
+            if self._sample is None:
+                self._sample = cProfile.Profile()
+            self._sample.enable()
+            try:
+                return fn(*args)
+            finally:
+                self._sample.disable()
+
+    def flush_worker(self):
+        """Save what a worker process collected so far
+
+        Called after every chunk, there's no hook for a worker's exit
+        """
+        pid = os.getpid()
+        if self._sample is not None:
+            self._sample.dump_stats(self._path("sample.{}.prof".format(pid)))
+        if "tracemalloc" in self.modes:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(self._path("tracemalloc.{}".format(pid)))
+
+    def stop(self):
+        """Stop profiling and write the output files
+
+        :rtype: List[str]
+        :return: paths of the files that were written
+        """
+        res = []
+        if self._profile is not None:
+            self._profile.disable()
+            res.append(self._path("cprofile.prof"))
+            self._profile.dump_stats(res[-1])
+            self._profile = None
+        if "sample" in self.modes:
+            path = self._write_samples()
+            if path is not None:
+                res.append(path)
+        if "tracemalloc" in self.modes:
+            res.extend(self._write_tracemalloc())
+        return res
+
+    def _write_samples(self):
+        """Merge this process' and the workers' samples into one file"""
+        import pstats
+
+        worker_files = glob.glob(self._path("sample.*.prof"))
+        stats = None
+        if self._sample is not None:
+            stats = pstats.Stats(self._sample)
+            self._sample = None
+        for f in worker_files:
+            if stats is None:
+                stats = pstats.Stats(f)
+            else:
+                stats.add(f)
+        if stats is None:
+            return None
+        path = self._path("sample.prof")
+        stats.dump_stats(path)
+        for f in worker_files:
+            os.remove(f)
+        return path
+
+    def _write_tracemalloc(self):
+        """Write the report and the final snapshot of this process"""
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+        snapshot_path = self._path("tracemalloc")
+        snapshot.dump(snapshot_path)
+
+        report_path = self._path("tracemalloc.txt")
+        with open(report_path, "w") as f:
+            self._report(f, "top allocators", snapshot.statistics("lineno"))
+            if self._first_snapshot is not None:
+                growth = snapshot.compare_to(self._first_snapshot, "lineno")
+                self._report(f, "growth since the start of the run", growth)
+                self._first_snapshot = None
+            for worker_path in sorted(glob.glob(self._path("tracemalloc.*"))):
+                if worker_path.endswith(".txt"):
+                    continue
+                worker = tracemalloc.Snapshot.load(worker_path)
+                self._report(
+                    f,
+                    "top allocators in worker {}".format(
+                        worker_path.rsplit(".", 1)[1]
+                    ),
+                    worker.statistics("lineno"),
+                )
+        return [report_path, snapshot_path]
+
+    def _report(self, f, title, statistics):
+        f.write("{}\n{}\n".format(title, "-" * len(title)))
+        for stat in statistics[: self.top]:
+            f.write("{}\n".format(stat))
+        f.write("\n")
@@ -0,0 +1,162 @@
+"""Cheap binary file detection
+
+
+"""
+import codecs
+import os
+import threading
+
+# never worth reading to decide
+BINARY_EXTENSIONS = frozenset(
+    [
+        ".7z",
+        ".a",
+        ".bin",
+        ".bmp",
+        ".bz2",
+        ".class",
+        ".dll",
+        ".dylib",
+        ".exe",
+        ".gif",
+        ".gz",
+        ".ico",
+        ".jar",
+        ".jpeg",
+        ".jpg",
+        ".o",
+        ".pdf",
+        ".png",
+        ".pyc",
+        ".so",
+        ".tar",
+        ".tgz",
+        ".whl",
+        ".xz",
+        ".zip",
+        ".zst",
+    ]
+)
+
+
+def sniff_binary(file_path, size=8192):
+    """Return True if the start of a file looks binary
+
+    Only the first size bytes are read. They're binary if they contain a NUL
+    byte or aren't valid utf-8. A multi-byte character cut off at the end of
+    the sample doesn't count
+
+    :param str file_path: absolute path to a file
+    :param int size: bytes to read
+
+    :rtype: bool
+    """
+    with open(file_path, "rb") as f:
+        chunk = f.read(size)
+    if b"\0" in chunk:
+        return True
+    decoder = codecs.getincrementaldecoder("utf8")()
+    try:
+        decoder.decode(chunk, final=len(chunk) < size)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+class BinarySniffer(object):
+    """sniff_binary with cached verdicts
+
+    Verdicts are cached by inode (with size and mtime), so hard links and
+    repeated checks of the same file are free. Once learn_after files with
+    the same extension have all been binary, the rest of the files with that
+    extension are binary without being read. Text verdicts are never
+    learned, so a binary file with a text-looking extension is still
+    caught. Files without an extension are always sniffed. Extensions in
+    binary_extensions are binary without a read. Files that can't be stated
+    or read (e.g. dangling symlinks) count as binary so they're skipped.
+    Safe to share between threads
+
+    """
+
+    # forget the inode verdicts when there are this many
+    max_inodes = 100000
+
+    def __init__(
+        self, size=8192, learn_after=32, binary_extensions=BINARY_EXTENSIONS
+    ):
+        """
+
+        :param int size: bytes read from each file
+        :param int learn_after: treat an extension as binary after this many
+            binary verdicts and no text ones. 0 never does
+        :param Iterable[str] binary_extensions: lower case, with the dot
+        """
+        self.size = size
+        self.learn_after = learn_after
+        self.binary_extensions = frozenset(binary_extensions)
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._inodes = {}
+        # extension: [binary verdicts, text verdicts]
+        self._extension_counts = {}
+        # learned binary extensions
+        self._extensions = set()
+
+    def __getstate__(self):
+        # process workers get an empty cache
+        state = self.__dict__.copy()
+        for k in ["_lock", "_inodes", "_extension_counts", "_extensions"]:
+            del state[k]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def is_binary(self, file_path):
+        """Return True if the file looks binary
+
+        :param Union[str, os.DirEntry] file_path: absolute path or the
+            crawl's os.DirEntry, which saves a stat
+
+        :rtype: bool
+        """
+        entry = not isinstance(file_path, str)
+        if entry:
+            path, name = file_path.path, file_path.name
+        else:
+            path, name = file_path, os.path.basename(file_path)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in self.binary_extensions:
+            return True
+        if ext in self._extensions:
+            return True
+
+        try:
+            st = file_path.stat() if entry else os.stat(path)
+            key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            verdict = self._inodes.get(key)
+            if verdict is not None:
+                return verdict
+            verdict = sniff_binary(path, self.size)
+        except OSError:
+            # dangling symlink, no permission, deleted since the crawl
+            return True
+        with self._lock:
+            if len(self._inodes) >= self.max_inodes:
+                self._inodes.clear()
+            self._inodes[key] = verdict
+            if ext and self.learn_after:
+                self._learn(ext, verdict)
+        return verdict
+
+    def _learn(self, ext, verdict):
+        counts = self._extension_counts.setdefault(ext, [0, 0])
+        counts[0 if verdict else 1] += 1
+        if counts[1]:
+            # a text file. never skip reading this extension
+            return
+        if counts[0] >= self.learn_after:
+            self._extensions.add(ext)
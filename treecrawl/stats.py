@@ -0,0 +1,168 @@
+"""Timing and throughput of a Transformer run
+
+
+"""
+import heapq
+import random
+from collections import Counter
+
+
+class FileStats(object):
+    """Events and phase times of one file's transform
+
+    Collected wherever the transform runs (including worker processes) and
+    merged into the run's RunStats
+
+    """
+
+    __slots__ = ("counts", "seconds", "latency")
+
+    def __init__(self):
+        self.counts = Counter()
+        self.seconds = Counter()
+        self.latency = 0.0
+
+
+class RunStats(object):
+    """Counters, per phase times and per file latency of a run
+
+    counts(Counter): files_scanned, files_targeted, files_transformed,
+    files_skipped, files_failed, bytes_read, bytes_written and any event
+    counted with Transformer.count_event
+
+    seconds(Counter): time spent in each phase. walk and is_target are
+    measured in the parent. read and write are measured by the Transformer
+    I/O helpers. transform is the rest of each file's transform time. With a
+    pool backend the per file phases add up across workers, so they can
+    exceed the elapsed time
+
+    elapsed(float): wall clock seconds for the whole run
+
+    The latency percentiles are computed from a uniform sample of at most
+    sample_size files, so memory doesn't grow with the tree
+
+    """
+
+    sample_size = 10000
+
+    def __init__(self, slowest=10):
+        """
+
+        :param int slowest: how many of the slowest files to keep
+        """
+        self.counts = Counter()
+        self.seconds = Counter()
+        self.elapsed = 0.0
+        self.slowest_size = slowest
+        self._slowest = []
+        self._latencies = []
+        self._latency_count = 0
+        self._rng = random.Random(0)
+
+    def add_file(self, source_file, file_stats):
+        """Merge one transformed file
+
+        :param str source_file: abs path to the input file
+        :param FileStats file_stats: events, phases and latency of the file
+        """
+        latency = file_stats.latency
+        self.counts.update(file_stats.counts)
+        self.seconds.update(file_stats.seconds)
+        io = file_stats.seconds["read"] + file_stats.seconds["write"]
+        self.seconds["transform"] += max(0.0, latency - io)
+
+        # reservoir sample for the percentiles
+        self._latency_count += 1
+        if len(self._latencies) < self.sample_size:
+            self._latencies.append(latency)
+        else:
+            i = self._rng.randrange(self._latency_count)
+            if i < self.sample_size:
+                self._latencies[i] = latency
+
+        if self.slowest_size:
+            item = (latency, source_file)
+            if len(self._slowest) < self.slowest_size:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def percentile(self, p):
+        """Return the p-th percentile of the per file latency
+
+        :param float p: 0 - 100
+
+        :rtype: Optional[float]
+        """
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        i = int(round(p / 100.0 * (len(ordered) - 1)))
+        return ordered[i]
+
+    @property
+    def slowest(self):
+        """The slowest files, slowest first
+
+        :rtype: List[Tuple[float, str]]
+        """
+        return sorted(self._slowest, reverse=True)
+
+    def as_dict(self):
+        """Return the stats as JSON serializable data
+
+        :rtype: Dict[str, Any]
+        """
+        elapsed = self.elapsed
+        transformed = self.counts["files_transformed"]
+        return {
+            "elapsed_seconds": elapsed,
+            "counts": dict(self.counts),
+            "phase_seconds": dict(self.seconds),
+            "files_per_second": transformed / elapsed if elapsed else None,
+            "bytes_per_second": (
+                (self.counts["bytes_read"] + self.counts["bytes_written"])
+                / elapsed
+                if elapsed
+                else None
+            ),
+            "latency_seconds": {
+                "p50": self.percentile(50),
+                "p99": self.percentile(99),
+            },
+            "slowest_files": [
+                {"file": f, "seconds": s} for s, f in self.slowest
+            ],
+        }
+
+    def write_json(self, path):
+        """Write as_dict() to a file
+
+        :param str path: absolute path to the JSON file
+        """
+        import json
+
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+    def summary(self):
+        """One line summary for the log
+
+        :rtype: str
+        """
+        d = self.as_dict()
+        counts = ", ".join(
+            "{}: {}".format(k, v) for k, v in sorted(self.counts.items())
+        )
+        phases = ", ".join(
+            "{}: {:.3f}s".format(k, v) for k, v in sorted(self.seconds.items())
+        )
+        latency = d["latency_seconds"]
+        res = "elapsed: {:.3f}s, {}, phases: [{}]".format(
+            self.elapsed, counts, phases
+        )
+        if latency["p50"] is not None:
+            res += ", p50: {:.6f}s, p99: {:.6f}s".format(
+                latency["p50"], latency["p99"]
+            )
+        return res
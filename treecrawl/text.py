@@ -0,0 +1,348 @@
+"""Built in text edits and a Transformer that applies them
+
+
+"""
+import re
+from .transformer import Transformer
+
+
+class Edit(object):
+    """A str to str edit applied by TextTransformer
+
+    Override apply(). Override may_change() too if the input bytes can show
+    cheaply that apply() would leave a file alone
+
+    """
+
+    def apply(self, text):
+        """Return the edited text
+
+        :param str text: file contents
+
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def may_change(self, data):
+        """Return False if apply() can't change this file
+
+        :param mmap.mmap data: the utf-8 encoded file contents
+
+        :rtype: bool
+        """
+        return True
+
+    def __repr__(self):
+        # part of TextTransformer.cache_identity
+        args = ", ".join(
+            "{}={!r}".format(k, v)
+            for k, v in sorted(vars(self).items())
+            if not k.startswith("_")
+        )
+        return "{}({})".format(self.__class__.__name__, args)
+
+
+class RegexReplace(Edit):
+    """re.sub every match of pattern with repl"""
+
+    def __init__(self, pattern, repl, flags=0):
+        """
+
+        :param str pattern: regular expression
+        :param str repl: replacement. may contain group references
+        :param int flags: re flags
+        """
+        self.pattern = re.compile(pattern, flags)
+        self.repl = repl
+
+    def apply(self, text):
+        return self.pattern.sub(self.repl, text)
+
+
+class LiteralReplace(Edit):
+    """str.replace every occurrence of old with new"""
+
+    def __init__(self, old, new):
+        """
+
+        :param str old: text to replace
+        :param str new: replacement
+        """
+        if not old:
+            raise ValueError("LiteralReplace needs something to replace")
+        self.old = old
+        self.new = new
+        self._old_bytes = old.encode("utf8")
+
+    def apply(self, text):
+        return text.replace(self.old, self.new)
+
+    def may_change(self, data):
+        return data.find(self._old_bytes) != -1
+
+
+def _trie_pattern(words):
+    """Return a regex matching any of words, factored by common prefixes
+
+    At every branch the next character picks at most one alternative and
+    the optional tails are greedy, so a match is always the longest word
+    starting at that position
+
+    :param Iterable[str] words: non-empty literal strings
+
+    :rtype: str
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for c in w:
+            node = node.setdefault(c, {})
+        # end of a word
+        node[""] = {}
+
+    def build(node):
+        alts = [
+            re.escape(c) + build(child)
+            for c, child in sorted(node.items())
+            if c
+        ]
+        if not alts:
+            return ""
+        if "" in node:
+            return "(?:{})?".format("|".join(alts))
+        if len(alts) == 1:
+            return alts[0]
+        return "(?:{})".format("|".join(alts))
+
+    return build(trie)
+
+
+class MultiReplace(Edit):
+    """Replace every key of a table with its value in one scan
+
+    The keys are compiled into one prefix factored regex, so the cost of a
+    scan depends on the file size and the key lengths, not the number of
+    keys. Matches are leftmost-longest: with keys "foo" and "foobar",
+    "foobar" wins wherever both match. Replacements aren't scanned again
+
+    """
+
+    def __init__(self, table, whole_words=False):
+        """
+
+        :param Dict[str, str] table: replace each key with its value
+        :param bool whole_words: only replace keys that aren't part of a
+            longer word (\\w characters on either side)
+        """
+        if not table or not all(table):
+            raise ValueError("MultiReplace needs non-empty keys")
+        self.table = dict(table)
+        self.whole_words = whole_words
+        pattern = _trie_pattern(self.table)
+        if whole_words:
+            pattern = r"(?<!\w)(?:{})(?!\w)".format(pattern)
+        self._pattern = re.compile(pattern)
+        # the same trie over the utf-8 bytes of the keys, one latin-1
+        # character per byte
+        latin = [k.encode("utf8").decode("latin-1") for k in self.table]
+        self._bytes_pattern = re.compile(
+            _trie_pattern(latin).encode("latin-1")
+        )
+
+    def apply(self, text):
+        table = self.table
+        return self._pattern.sub(lambda m: table[m.group(0)], text)
+
+    def may_change(self, data):
+        return self._bytes_pattern.search(data) is not None
+
+
+def load_table(path):
+    """Read a replacement table, one tab separated "old<TAB>new" per line
+
+    Empty lines and lines starting with # are skipped
+
+    :param str path: table file
+
+    :rtype: Dict[str, str]
+    """
+    table = {}
+    with open(path, encoding="utf8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            old, sep, new = line.partition("\t")
+            if not sep or not old:
+                raise ValueError("{}:{}: expected old<TAB>new".format(path, n))
+            table[old] = new
+    return table
+
+
+class StripChars(Edit):
+    """Remove every occurrence of the given characters
+
+    StripChars("\\u2029") is the u2029 remover from the usage docs
+    """
+
+    def __init__(self, chars):
+        """
+
+        :param str chars: characters to remove
+        """
+        self.chars = chars
+        self._table = {ord(c): None for c in chars}
+        self._chars_bytes = [c.encode("utf8") for c in set(chars)]
+
+    def apply(self, text):
+        return text.translate(self._table)
+
+    def may_change(self, data):
+        return any(data.find(c) != -1 for c in self._chars_bytes)
+
+
+class MapCase(Edit):
+    """Change the case of the text. mode is one of MapCase.modes"""
+
+    modes = ("upper", "lower", "swapcase")
+
+    def __init__(self, mode):
+        """
+
+        :param str mode: upper, lower or swapcase
+        """
+        if mode not in MapCase.modes:
+            raise ValueError(
+                "Unknown case mode: {}. Expected one of {}".format(
+                    mode, MapCase.modes
+                )
+            )
+        self.mode = mode
+
+    def apply(self, text):
+        return getattr(text, self.mode)()
+
+
+class NormalizeLineEndings(Edit):
+    """Convert \\r\\n and lone \\r line endings to one style
+
+    ending is one of NormalizeLineEndings.endings
+    """
+
+    endings = {"lf": "\n", "crlf": "\r\n"}
+
+    def __init__(self, ending):
+        """
+
+        :param str ending: lf or crlf
+        """
+        if ending not in NormalizeLineEndings.endings:
+            raise ValueError(
+                "Unknown line ending: {}. Expected one of {}".format(
+                    ending, tuple(NormalizeLineEndings.endings)
+                )
+            )
+        self.ending = ending
+
+    def apply(self, text):
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if self.ending == "crlf":
+            text = text.replace("\n", "\r\n")
+        return text
+
+    def may_change(self, data):
+        if self.ending == "lf":
+            return data.find(b"\r") != -1
+        return True
+
+
+class TextTransformer(Transformer):
+    """Apply a list of edits, in order, to every targeted utf-8 file
+
+    Files are memory mapped (see Transformer.map_to_output). When the
+    edits' may_change() rule a file out it isn't decoded at all. Files that
+    aren't valid utf-8 are left alone and counted as "undecodable".
+    Unchanged files aren't rewritten in place
+
+    Every file that passes include and exclude (see
+    Transformer.iter_source_dest) is targeted. Binary files (see
+    Transformer.is_binary) are skipped and counted as "files_binary" unless
+    skip_binary is False
+
+    """
+
+    target_entries = True
+    skip_binary = True
+
+    def __init__(self, input=None, output=None, edits=(), **kwargs):
+        """
+
+        :param str input: input file or directory
+        :param str output: output file or directory
+        :param List[Edit] edits: applied in order
+        :param kwargs: passed to Transformer
+        """
+        self.edits = list(edits)
+        super().__init__(input=input, output=output, **kwargs)
+
+    def cache_identity(self):
+        return "{}:{!r}".format(super().cache_identity(), self.edits)
+
+    def is_target(self, i_file):
+        if self.skip_binary and self.is_binary(i_file):
+            self.count_event("files_binary")
+            return False
+        return True
+
+    def transform(self, source_file, destination_file):
+        if not self.dry_run:
+            self.map_to_output(source_file, destination_file)
+            return
+        from treecrawl.utility import map_file
+
+        with map_file(source_file) as data:
+            if self.transform_bytes(data) is None:
+                self.count_event("unchanged")
+                return
+        self.count_event("changed")
+        self.log_file("edit", "edit %s", source_file)
+
+    def transform_bytes(self, data):
+        if not any(e.may_change(data) for e in self.edits):
+            return None
+        try:
+            text = bytes(data).decode("utf8")
+        except UnicodeDecodeError:
+            self.count_event("undecodable")
+            return None
+        res = text
+        for e in self.edits:
+            res = e.apply(res)
+        if res == text:
+            return None
+        return res.encode("utf8")
+
+
+class ReplaceTransformer(TextTransformer):
+    """Rename many strings across a tree in one pass per file
+
+    A TextTransformer with a single MultiReplace edit. see MultiReplace for
+    the matching rules
+
+    """
+
+    def __init__(self, input, output, table, whole_words=False, **kwargs):
+        """
+
+        :param str input: input file or directory
+        :param str output: output file or directory
+        :param Dict[str, str] table: replace each key with its value
+        :param bool whole_words: see MultiReplace
+        :param kwargs: passed to Transformer
+        """
+        super().__init__(
+            input=input,
+            output=output,
+            edits=[MultiReplace(table, whole_words)],
+            **kwargs
+        )
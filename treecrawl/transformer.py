@@ -1,11 +1,63 @@
 import logging
 import os
+import threading
+from time import perf_counter
+from .log import EventSampler
+from .sniff import BinarySniffer
+from .stats import FileStats, RunStats
 from .utility import string_to_log_level, validate_path
 from treecrawl.utility import create_module_logger
 
 module_name = str(__name__)
 module_logger = create_module_logger(module_name)
 
+# each worker process in a parallel run gets its own copy of the transformer.
+# it's set once by the pool initializer so it isn't pickled for every chunk
+_worker_transformer = None
+
+
+# stats of the file being transformed on this thread. see count_event
+_file_events = threading.local()
+_stats_lock = threading.Lock()
+
+
+def _globs_tuple(value):
+    """Return include or exclude as a tuple. A str is a single glob
+
+    :param Union[str, Iterable[str]] value: globs
+
+    :rtype: Tuple[str, ...]
+    """
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+def _init_worker(transformer):
+    from .log import stop_background_logging
+
+    global _worker_transformer
+    _worker_transformer = transformer
+    # a forked worker has the parent's queue but not its listener thread
+    stop_background_logging()
+    if transformer._profiler is not None:
+        transformer._profiler = transformer._profiler.for_worker()
+        transformer._profiler.start()
+
+
+def _transform_in_worker(chunk):
+    """Run a chunk of transforms in a pool worker process
+
+    :param List[Tuple[str, str]] chunk: source and destination files
+
+    :rtype: List[Tuple[str, str, Optional[str], Optional[FileStats]]]
+    """
+    res = [_worker_transformer._transform_or_error(p) for p in chunk]
+    _worker_transformer._sync_written()
+    if _worker_transformer._profiler is not None:
+        _worker_transformer._profiler.flush_worker()
+    return res
+
 
 class Transformer(object):
     """Transform a file or directory
@@ -16,12 +68,49 @@ class Transformer(object):
     """
 
     dry_run_prefix = "SKIPPING! (DRY RUN): "
+    # set True to pass is_target the crawl's os.DirEntry instead of a path
+    target_entries = False
+    # base names of directories that are never crawled. see is_target_dir
+    exclude_dirs = ()
+    # globs matched against paths relative to input. see iter_source_dest
+    include = ()
+    exclude = ()
+    # change this whenever transform changes its output for the same input.
+    # it's part of the cache_dir key
+    cache_version = "1"
+    # number of slowest files listed in the run stats
+    slowest_files = 10
+    backends = ("process", "thread")
+    durabilities = ("none", "file", "batch")
+    # files sent to a worker process at a time
+    process_chunksize = 32
 
     def __init__(
-        self, input=None, output=None, log_level="INFO", dry_run=True
+        self,
+        input=None,
+        output=None,
+        log_level="INFO",
+        dry_run=True,
+        jobs=1,
+        backend="process",
+        max_in_flight=None,
+        manifest=None,
+        full=False,
+        cache_dir=None,
+        cache_max_bytes=1024**3,
+        atomic_writes=False,
+        durability="none",
+        write_if_changed=False,
+        stats_file=None,
+        profile=None,
+        profile_dir=None,
+        profile_every=100,
+        log_background=False,
+        log_every=1,
+        log_per_second=None,
+        include=None,
+        exclude=None,
     ):
-        import json
-
         if input is None:
             self._input = os.getcwd()
         else:
@@ -36,15 +125,99 @@ class Transformer(object):
         self.log_level = string_to_log_level(log_level)
         self.logger.setLevel(self.log_level)
         self.dry_run = dry_run
+        self.jobs = jobs
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.manifest = manifest
+        self.full = full
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.atomic_writes = atomic_writes
+        self.durability = durability
+        self.write_if_changed = write_if_changed
+        self.stats_file = stats_file
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.profile_every = profile_every
+        self.profile_files = []
+        self.log_background = log_background
+        self.log_every = log_every
+        self.log_per_second = log_per_second
+        self._log_sampler = EventSampler(log_every, log_per_second)
+        self.binary_sniffer = BinarySniffer()
+        if include is not None:
+            self.include = _globs_tuple(include)
+        if exclude is not None:
+            self.exclude = _globs_tuple(exclude)
+        self._glob_sets = None
+        self._started_background_logging = False
+        self.stats = RunStats(self.slowest_files)
+        self._made_dirs = set()
+        self._manifest = None
+        self._cache = None
+        self._profiler = None
+        self._unsynced = []
+
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log_settings()
+
+    def _log_settings(self):
+        """Log the settings as JSON"""
+        import json
 
         msg_dict = {
             "input": self.input,
             "output": self.output,
             "log_level": self.log_level,
             "dry_run": str(self.dry_run),
+            "jobs": self.jobs,
+            "backend": self.backend,
+            "manifest": self.manifest,
+            "full": str(self.full),
+            "cache_dir": self.cache_dir,
+            "atomic_writes": str(self.atomic_writes),
+            "durability": self.durability,
+            "write_if_changed": str(self.write_if_changed),
+            "stats_file": self.stats_file,
+            "profile": list(self.profile),
+            "log_background": str(self.log_background),
+            "include": list(_globs_tuple(self.include)),
+            "exclude": list(_globs_tuple(self.exclude)),
         }
         self.logger.info(json.dumps(msg_dict))
 
+    def __getstate__(self):
+        # pool workers get a copy of the transformer. they don't need the
+        # manifest, which can be large
+        state = self.__dict__.copy()
+        state["_manifest"] = None
+        state["_unsynced"] = []
+        state["_made_dirs"] = set()
+        # workers send their stats back per file
+        state["stats"] = RunStats(0)
+        return state
+
+    def log_file(self, event, msg, *args, level=logging.INFO):
+        """Log a per file message, sampled and rate limited
+
+        For messages logged once per file, like "would edit X" in a dry run.
+        Only the first and every self.log_every-th message of each event
+        are written, at most self.log_per_second per second. The message
+        gets the dry run prefix and is only formatted if it's written. The
+        rest are counted as "log_suppressed" in the run stats
+
+        :param str event: groups messages for sampling, e.g. "edit"
+        :param str msg: logging format string
+        :param args: logging format arguments
+        :param int level: logging level
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if not self._log_sampler.allow(event):
+            self.count_event("log_suppressed")
+            return
+        self.logger.log(level, self.add_dry_run_prefix(msg), *args)
+
     def add_dry_run_prefix(self, mm):
         """if the dry_run flag is set prepend the message with skipping..
 
@@ -81,50 +254,192 @@ class Transformer(object):
         """
         return self._input == self._output
 
-    def source_dest_as_dict(self):
-        """If the target us a directory, return dict of input:output files
+    def iter_source_dest(self):
+        """Yield (input, output) file pairs as the crawl discovers targets
 
-        The logic for selecting targets can be customized by overriding this
-        method.
+        Nothing is collected up front beyond one directory listing at a
+        time, so memory stays flat on huge trees and run() starts
+        transforming with the first target found. An output directory inside
+        the input is never crawled. The logic for selecting targets can be
+        customized by overriding this method.
 
-        :rtype: Dict[str, str]
+        self.include and self.exclude are glob lists matched against the
+        "/" separated path relative to input (see globs.translate). A file
+        is passed to is_target if it matches an include pattern (any file if
+        include is empty) and no exclude pattern. Directory-only exclude
+        patterns ("build/", "docs/**") prune the walk like is_target_dir.
+        Each list is compiled into one regex. A single glob can be given as
+        a str
+
+        :rtype: Iterator[Tuple[str, str]]
         """
         from treecrawl.utility import (
-            get_all_files,
+            iter_file_entries,
             output_file_from_input_file,
         )
 
-        res = {}
         if os.path.isfile(self.input):
-            return {self.input: self.output}
+            yield self.input, self.output
+            return
+
+        include, exclude = self._globs()
+        prefix_len = len(os.path.join(self.input, ""))
+
+        def rel(path):
+            res = path[prefix_len:]
+            return res if os.sep == "/" else res.replace(os.sep, "/")
 
-        input_files = get_all_files(self.input)
-        for file in input_files:
-            if self.is_target(file):
+        # don't crawl (and transform) outputs written under the input
+        output_dir = None
+        if self.output is not None and not self.in_place():
+            output_dir = os.path.realpath(self.output)
+
+        def is_target_dir(entry):
+            if entry.path == output_dir:
+                return False
+            if exclude and exclude.match_dir(rel(entry.path)):
+                return False
+            return self.is_target_dir(
+                entry if self.target_entries else entry.path
+            )
+
+        def matches(path):
+            if include and not include.match(path):
+                return False
+            return not (exclude and exclude.match(path))
+
+        counts, seconds = self.stats.counts, self.stats.seconds
+        entries = iter_file_entries(self.input, is_target_dir)
+        while True:
+            start = perf_counter()
+            entry = next(entries, None)
+            walked = perf_counter()
+            seconds["walk"] += walked - start
+            if entry is None:
+                return
+            counts["files_scanned"] += 1
+            candidate = entry if self.target_entries else entry.path
+            target = matches(rel(entry.path)) and self.is_target(candidate)
+            seconds["is_target"] += perf_counter() - walked
+            if target:
+                counts["files_targeted"] += 1
                 # transform input file and write to destination
                 # in the same relative path in the output dir
-                res[file] = output_file_from_input_file(
-                    self.input, self.output, file
+                yield entry.path, output_file_from_input_file(
+                    self.input, self.output, entry.path
                 )
 
-        return res
+    def _globs(self):
+        """Return GlobSets for self.include and self.exclude
+
+        Compiled once and again only if the lists change
+
+        :rtype: Tuple[GlobSet, GlobSet]
+        """
+        from .globs import GlobSet
+
+        key = (_globs_tuple(self.include), _globs_tuple(self.exclude))
+        if self._glob_sets is None or self._glob_sets[0] != key:
+            self._glob_sets = (key, GlobSet(key[0]), GlobSet(key[1]))
+        return self._glob_sets[1:]
+
+    def source_dest_as_dict(self):
+        """If the target us a directory, return dict of input:output files
+
+        Kept for compatibility. It collects iter_source_dest() into a dict
+
+        :rtype: Dict[str, str]
+        """
+        return dict(self.iter_source_dest())
+
+    def _iter_pairs(self):
+        """Yield the pairs run() should transform
+
+        Subclasses written before iter_source_dest() customized targeting by
+        overriding source_dest_as_dict. Keep honoring that override
+
+        :rtype: Iterator[Tuple[str, str]]
+        """
+        if type(self).source_dest_as_dict is Transformer.source_dest_as_dict:
+            pairs = self.iter_source_dest()
+        else:
+            pairs = self.source_dest_as_dict().items()
+        skipped = 0
+        for k, v in pairs:
+            if v is None:
+                v = k
+            if self._manifest is not None and not self.full:
+                if self._manifest.is_current(k, v):
+                    skipped += 1
+                    self.stats.counts["files_skipped"] += 1
+                    continue
+            yield k, v
+        if skipped:
+            self.logger.info(
+                "skipped {} files unchanged since the last run".format(skipped)
+            )
 
     def is_target(self, i_file):
         """Return True is the file meets criteria to be transformed
 
         This is used by filter_files to build a target list.  The base
-        implementation edits all files. Override this method to customizing
-        file targeting
+        implementation targets every file that passed self.include and
+        self.exclude, and raises NotImplementedError if self.include is
+        empty. An exclude alone doesn't opt anything in. Override this
+        method to customizing file targeting
 
         WARNING!! I use opt-in targeting because treecrawl functions do not
-        protect your binary files from being manipulated like  text files
+        protect your binary files from being manipulated like  text files.
+        Call self.is_binary(i_file) to skip them cheaply
+
+        If self.target_entries is True, i_file is the os.DirEntry from the
+        crawl. i_file.path is the abs path, and i_file.is_file() and
+        i_file.stat() reuse what the crawl already fetched instead of making
+        new syscalls
 
         :param str i_file: abs path to target candidate
 
         :rtype: bool
         """
+        if self.include:
+            return True
         raise NotImplementedError
 
+    def is_binary(self, i_file):
+        """Return True if the file looks binary
+
+        Only the first few KB are read and checked for NUL bytes and invalid
+        utf-8. Verdicts are cached by inode and, once an extension has only
+        been binary, by extension. Files that can't be read count as binary.
+        see sniff.BinarySniffer. Set
+        self.binary_sniffer to change the sample size or the extensions
+
+        :param Union[str, os.DirEntry] i_file: abs path or crawl entry
+
+        :rtype: bool
+        """
+        return self.binary_sniffer.is_binary(i_file)
+
+    def is_target_dir(self, i_dir):
+        """Return False to skip a directory and everything under it
+
+        Pruned directories are never listed, so nothing inside them is stated
+        or passed to is_target. The base implementation prunes directories
+        whose base name is in self.exclude_dirs. for example:
+        exclude_dirs = (".git", "node_modules", ".venv")
+
+        i_dir is an os.DirEntry when self.target_entries is True
+
+        :param str i_dir: abs path to a subdirectory of the input
+
+        :rtype: bool
+        """
+        if self.target_entries:
+            name = i_dir.name
+        else:
+            name = os.path.basename(i_dir)
+        return name not in self.exclude_dirs
+
     def transform(self, source_file, destination_file):
         """Override this with transformation logic
 
@@ -143,11 +458,599 @@ class Transformer(object):
         """
         raise NotImplementedError
 
+    def transform_stream(self, reader, writer):
+        """Override this with streaming transformation logic
+
+        Called by stream_to_output. Read from reader and write to writer a
+        piece at a time (for line in reader, reader.read(size), ...) so memory
+        use doesn't depend on the file size
+
+        :param IO reader: open input file
+        :param IO writer: open output file
+
+        """
+        raise NotImplementedError
+
+    def stream_to_output(self, source_file, destination_file, binary=False):
+        """Stream source_file through transform_stream to destination_file
+
+        Use it from transform for files too big to hold in memory. The
+        output is written progressively to a temp file that replaces the
+        destination at the end, so in place transforms work too. see
+        utility.open_input and utility.open_output
+
+        :param str source_file: read this file as input
+        :param str destination_file: write transformed file here
+        :param bool binary: stream bytes instead of text
+        """
+        from treecrawl.utility import open_input, open_output
+
+        fsync = self.durability == "file"
+        self.make_output_dir(destination_file)
+        with open_input(source_file, binary=binary) as reader:
+            with open_output(
+                destination_file, binary=binary, fsync=fsync, make_dirs=False
+            ) as writer:
+                self.transform_stream(reader, writer)
+                self.count_event("bytes_read", reader.tell())
+                self.count_event("bytes_written", writer.tell())
+        self._wrote(destination_file)
+
+    def transform_bytes(self, data):
+        """Override this with byte level transformation logic
+
+        Called by map_to_output with the input file memory mapped. Scan it in
+        place (re with bytes patterns, data.find, ...) and return None when
+        nothing needs to change. Otherwise return the new contents as bytes
+        (or any bytes-like object)
+
+        :param mmap.mmap data: read only map of the input file
+
+        :rtype: Optional[bytes]
+        """
+        raise NotImplementedError
+
+    def map_to_output(self, source_file, destination_file):
+        """Pass a memory mapped source_file to transform_bytes
+
+        If transform_bytes returns None the input is unchanged. Nothing is
+        written for an in place run, otherwise the input is copied to the
+        destination. Both are written through utility.open_output
+
+        :param str source_file: read this file as input
+        :param str destination_file: write transformed file here
+
+        :rtype: bool
+        :return: True if transform_bytes changed the contents
+        """
+        from treecrawl.utility import map_file
+
+        with map_file(source_file) as data:
+            self.count_event("bytes_read", len(data))
+            res = self.transform_bytes(data)
+            if res is None:
+                self.count_event("unchanged")
+                if source_file != destination_file:
+                    self._write_bytes(data, destination_file)
+                return False
+            self._write_bytes(res, destination_file)
+        self.count_event("changed")
+        return True
+
+    def _write_bytes(self, data, o):
+        """Write data through utility.open_output with the run's durability
+
+        :param bytes data: new contents
+        :param str o: absolute path to the output file
+        """
+        from treecrawl.utility import open_output
+
+        start = perf_counter()
+        self.make_output_dir(o)
+        with open_output(
+            o, binary=True, fsync=self.durability == "file", make_dirs=False
+        ) as writer:
+            writer.write(data)
+        self.time_phase("write", perf_counter() - start)
+        self.count_event("bytes_written", len(data))
+        self._wrote(o)
+
+    @property
+    def jobs(self):
+        return self._jobs
+
+    @jobs.setter
+    def jobs(self, value):
+        if value is None:
+            value = os.cpu_count() or 1
+        if int(value) < 1:
+            raise RuntimeError("jobs must be at least 1. Got {}".format(value))
+        self._jobs = int(value)
+        return self._jobs
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        if value not in Transformer.backends:
+            raise RuntimeError(
+                "Unknown backend: {}. Expected one of {}".format(
+                    value, Transformer.backends
+                )
+            )
+        self._backend = value
+        return self._backend
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @profile.setter
+    def profile(self, value):
+        from . import profiling
+
+        if value is None:
+            value = ()
+        elif isinstance(value, str):
+            value = (value,)
+        value = tuple(value)
+        for mode in value:
+            if mode not in profiling.modes:
+                raise RuntimeError(
+                    "Unknown profile mode: {}. Expected one of {}".format(
+                        mode, profiling.modes
+                    )
+                )
+        if "cprofile" in value and "sample" in value:
+            # only one cProfile.Profile can be enabled at a time
+            raise RuntimeError("cprofile and sample can't be combined")
+        self._profile = value
+        return self._profile
+
+    @property
+    def durability(self):
+        return self._durability
+
+    @durability.setter
+    def durability(self, value):
+        if value not in Transformer.durabilities:
+            raise RuntimeError(
+                "Unknown durability: {}. Expected one of {}".format(
+                    value, Transformer.durabilities
+                )
+            )
+        self._durability = value
+        return self._durability
+
     def run(self):
-        for k, v in self.source_dest_as_dict().items():
-            if v is None:
-                v = k
-            self.transform(k, v)
+        """Transform every target
+
+        If self.jobs is greater than 1, the transforms are spread across a
+        pool of workers selected by self.backend:
+
+        "process": CPU bound transforms. The transformer (including
+        subclasses) is copied into each worker process, so it must be
+        picklable. Changes the transform makes to self are NOT copied back to
+        the parent.
+
+        "thread": I/O bound transforms. All of the threads share this
+        transformer so transform must be thread safe. write_output,
+        make_output_dir and mkdir_p already are.
+
+        No more than self.max_in_flight files are submitted to the pool at
+        once (default: 4 per job)
+
+        If self.manifest is a path, the run is incremental. Files whose size
+        and mtime match the manifest from the last run, and whose output
+        still exists, are skipped. A manifest written by a transformer with a
+        different cache_identity() is ignored. Set self.full to transform
+        everything anyway. The manifest is rewritten at the end of every run
+        that isn't a dry run
+
+        If self.cache_dir is set, outputs are cached by a hash of the input
+        contents and self.cache_identity(). A cache hit is copied to the
+        destination without calling transform. At the end of the run the
+        least recently used entries are evicted until the cache fits in
+        self.cache_max_bytes. The cache isn't used for dry runs
+
+        self.durability sets when the outputs written by the helpers
+        (write_output, stream_to_output, map_to_output) are flushed
+        to disk:
+
+        "none": left to the OS (default)
+
+        "file": each file (and its rename) is fsynced as it's written
+
+        "batch": the files and their directories are fsynced together at the
+        end of the run. process workers sync at the end of each chunk
+
+        Combine "file" or "batch" with self.atomic_writes = True so a crash
+        leaves either the old or the new version of each file, never a
+        truncated one
+
+        The run is timed and counted (see stats.RunStats). The stats are
+        logged at the end, written to self.stats_file as JSON if it's set
+        and returned
+
+        self.profile turns on one or more profiling modes (see
+        profiling.RunProfiler):
+
+        "cprofile": cProfile the whole run
+
+        "tracemalloc": trace allocations and report the top allocators and
+        the growth over the run
+
+        "sample": cProfile every self.profile_every-th transform call
+
+        The output files go to self.profile_dir, which defaults to the
+        directory of the log file (or the current directory). Their paths
+        are logged and kept in self.profile_files
+
+        :rtype: RunStats
+        """
+        self._start_run()
+        try:
+            if self.jobs == 1:
+                for k, v in self._iter_pairs():
+                    file_stats = self._transform_counted(k, v)
+                    self._finished(k, v, file_stats)
+            else:
+                self._run_in_pool(self._iter_pairs())
+        finally:
+            self._end_run()
+        return self.stats
+
+    def _start_run(self, open_stores=True):
+        """Set up run scoped state
+
+        :param bool open_stores: also call _open_stores
+        """
+        if open_stores:
+            self._open_stores()
+        self.stats = RunStats(self.slowest_files)
+        self._made_dirs = set()
+        self._log_sampler = EventSampler(self.log_every, self.log_per_second)
+        self._started_background_logging = False
+        if self.log_background:
+            from .log import start_background_logging
+
+            self._started_background_logging = start_background_logging()
+        self._profiler = None
+        if self.profile:
+            self._profiler = self._make_profiler()
+            self._profiler.start()
+        self._run_started = perf_counter()
+
+    def _open_stores(self):
+        """Load the manifest and open the cache. Blocking file I/O"""
+        from .cache import ResultCache
+        from .manifest import Manifest
+
+        self._manifest = None
+        if self.manifest is not None:
+            self._manifest = Manifest(self.manifest, self.cache_identity())
+        self._cache = None
+        if self.cache_dir is not None and not self.dry_run:
+            self._cache = ResultCache(self.cache_dir, self.cache_max_bytes)
+
+    def _close_stores(self):
+        """Save the manifest, evict the cache and fsync a batch. Blocking"""
+        if self._manifest is not None and not self.dry_run:
+            self._manifest.save()
+        self._manifest = None
+        if self._cache is not None:
+            self._cache.evict()
+        self._cache = None
+        self._sync_written()
+
+    def _make_profiler(self):
+        """Return a RunProfiler for self.profile
+
+        :rtype: RunProfiler
+        """
+        from datetime import datetime
+        from .profiling import RunProfiler, log_directory
+
+        directory = self.profile_dir or log_directory(self.logger)
+        prefix = "treecrawl-{}-{}-{}".format(
+            self.__class__.__name__,
+            datetime.now().strftime("%Y%m%d-%H%M%S"),
+            os.getpid(),
+        )
+        return RunProfiler(
+            self.profile, directory, prefix, every=self.profile_every
+        )
+
+    @property
+    def counts(self):
+        """The run's counters. see RunStats.counts
+
+        :rtype: Counter
+        """
+        return self.stats.counts
+
+    def count_event(self, event, n=1):
+        """Count something that happened to the current file
+
+        The counts from every backend end up in self.counts and are logged at
+        the end of the run. The output helpers count "changed" and
+        "unchanged" files and bytes_read and bytes_written. Transforms can
+        count their own events
+
+        :param str event: event name
+        :param int n: amount to add
+        """
+        current = getattr(_file_events, "current", None)
+        if current is not None:
+            current.counts[event] += n
+            return
+        # outside of a counted transform, e.g. a helper offloaded to a thread
+        with _stats_lock:
+            self.stats.counts[event] += n
+
+    def time_phase(self, phase, seconds):
+        """Add time spent in a phase of the current file's transform
+
+        The helpers time the "read" and "write" phases. Whatever isn't
+        attributed to a phase counts as "transform"
+
+        :param str phase: phase name
+        :param float seconds: time spent
+        """
+        current = getattr(_file_events, "current", None)
+        if current is not None:
+            current.seconds[phase] += seconds
+            return
+        with _stats_lock:
+            self.stats.seconds[phase] += seconds
+
+    def _transform_counted(self, source_file, destination_file):
+        """Transform one file and return what it counted and timed
+
+        :param str source_file: read this file as input
+        :param str destination_file: write transformed file here
+
+        :rtype: FileStats
+        """
+        current = FileStats()
+        _file_events.current = current
+        start = perf_counter()
+        try:
+            if self._profiler is None:
+                self._transform(source_file, destination_file)
+            else:
+                self._profiler.call(
+                    self._transform, source_file, destination_file
+                )
+        finally:
+            _file_events.current = None
+        current.latency = perf_counter() - start
+        return current
+
+    def _finished(self, source_file, destination_file, file_stats=None):
+        """Record a successful transform. Always called in the parent
+
+        :param str source_file: read this file as input
+        :param str destination_file: transformed file was written here
+        :param FileStats file_stats: counted while transforming the file
+        """
+        if self._manifest is not None and not self.dry_run:
+            self._manifest.record(source_file, destination_file)
+        with _stats_lock:
+            self.stats.counts["files_transformed"] += 1
+            if file_stats is not None:
+                self.stats.add_file(source_file, file_stats)
+
+    def _failed(self, source_file, error):
+        """Log a failed transform. Always called in the parent
+
+        :param str source_file: read this file as input
+        :param str error: formatted traceback
+        """
+        self.logger.error(
+            "transform failed: {}\n{}".format(source_file, error)
+        )
+        with _stats_lock:
+            self.stats.counts["files_failed"] += 1
+
+    def _end_run(self, close_stores=True):
+        """Persist and tear down run scoped state
+
+        :param bool close_stores: also call _close_stores
+        """
+        if close_stores:
+            self._close_stores()
+        self.stats.elapsed = perf_counter() - self._run_started
+        self.logger.info(self.stats.summary())
+        if self.stats_file is not None:
+            self.stats.write_json(self.stats_file)
+        if self._profiler is not None:
+            self.profile_files = self._profiler.stop()
+            self._profiler = None
+            for f in self.profile_files:
+                self.logger.info("profile written to %s", f)
+        if self._started_background_logging:
+            from .log import stop_background_logging
+
+            stop_background_logging()
+            self._started_background_logging = False
+
+    def cache_identity(self):
+        """Identify this transformer in cache keys
+
+        Override this if the output also depends on instance settings
+
+        :rtype: str
+        """
+        cls = self.__class__
+        return "{}.{}:{}".format(
+            cls.__module__, cls.__qualname__, self.cache_version
+        )
+
+    def _transform(self, source_file, destination_file):
+        """Call transform unless the output is already cached
+
+        :param str source_file: read this file as input
+        :param str destination_file: write transformed file here
+        """
+        cache = self._cache
+        if cache is None:
+            self.transform(source_file, destination_file)
+            return
+        key = cache.key(self.cache_identity(), source_file)
+        if self._fetch_cached(key, destination_file):
+            self.logger.debug("cache hit: %s", source_file)
+            return
+        self.transform(source_file, destination_file)
+        if os.path.isfile(destination_file):
+            cache.store(key, destination_file)
+
+    def _fetch_cached(self, key, destination_file):
+        """Copy a cached output like write_output would write it
+
+        self.atomic_writes, self.durability and self.write_if_changed apply,
+        and the "changed" and "unchanged" files are counted the same way
+
+        :param str key: from ResultCache.key
+        :param str destination_file: abs path to write the output to
+
+        :rtype: bool
+        :return: False if there's no entry for key
+        """
+        self.make_output_dir(destination_file)
+        written = self._cache.fetch(
+            key,
+            destination_file,
+            atomic=self.atomic_writes,
+            fsync=self.durability == "file",
+            only_if_changed=self.write_if_changed,
+            make_dirs=False,
+        )
+        if written is None:
+            return False
+        if not self.write_if_changed:
+            self._wrote(destination_file)
+        elif written:
+            self.count_event("changed")
+            self._wrote(destination_file)
+        else:
+            self.count_event("unchanged")
+        return True
+
+    def _transform_or_error(self, pair):
+        """Run one transform and return any error instead of raising it
+
+        Exceptions are formatted here because not every exception (or its
+        traceback) survives the trip back from a worker process
+
+        :param Tuple[str, str] pair: source and destination files
+
+        :rtype: Tuple[str, str, Optional[str], Optional[FileStats]]
+        """
+        import traceback
+
+        source_file, destination_file = pair
+        try:
+            file_stats = self._transform_counted(source_file, destination_file)
+        except Exception:
+            error = traceback.format_exc()
+            return source_file, destination_file, error, None
+        return source_file, destination_file, None, file_stats
+
+    def _run_in_pool(self, pairs):
+        """Transform pairs in the self.backend pool and re-raise failures
+
+        Every file is attempted. Each failure is logged with the worker
+        traceback and a RuntimeError is raised after the pool is drained
+
+        :param Iterable[Tuple[str, str]] pairs: source and destination files
+        """
+        from concurrent.futures import (
+            FIRST_COMPLETED,
+            ProcessPoolExecutor,
+            ThreadPoolExecutor,
+            wait,
+        )
+
+        max_in_flight = self.max_in_flight or self.jobs * 4
+        if self.backend == "process":
+            # process workers get the transformer once and files in chunks to
+            # amortize the IPC cost
+            executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                initializer=_init_worker,
+                initargs=(self,),
+            )
+            fn = _transform_in_worker
+            chunksize = max(1, min(self.process_chunksize, max_in_flight))
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.jobs)
+
+            def fn(chunk):
+                return [self._transform_or_error(p) for p in chunk]
+
+            chunksize = 1
+        max_tasks = max(1, max_in_flight // chunksize)
+
+        total = 0
+        failed = []
+
+        def collect(done):
+            for future in done:
+                for res in future.result():
+                    source_file, destination_file, error, file_stats = res
+                    if error is None:
+                        self._finished(
+                            source_file, destination_file, file_stats
+                        )
+                        continue
+                    self._failed(source_file, error)
+                    failed.append(source_file)
+
+        with executor:
+            pending = set()
+            chunk = []
+            for pair in pairs:
+                total += 1
+                chunk.append(pair)
+                if len(chunk) < chunksize:
+                    continue
+                if len(pending) >= max_tasks:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(executor.submit(fn, chunk))
+                chunk = []
+            if chunk:
+                pending.add(executor.submit(fn, chunk))
+            collect(wait(pending).done)
+
+        if failed:
+            raise RuntimeError(
+                "{} of {} transforms failed. first failure: {}".format(
+                    len(failed), total, failed[0]
+                )
+            )
+
+    def read_string(self, source_file):
+        """Return the contents of a file as a string
+
+        utility.file_to_string, counted in the run stats as the "read" phase
+        and bytes_read. bytes_read is the file size, not the decoded length
+
+        :param str source_file: absolute path to a file
+
+        :rtype: str
+        """
+        from treecrawl.utility import file_to_string
+
+        start = perf_counter()
+        res = file_to_string(source_file)
+        size = os.path.getsize(source_file)
+        self.time_phase("read", perf_counter() - start)
+        self.count_event("bytes_read", size)
+        return res
 
     @staticmethod
     def write_string_to_output(s, o):
@@ -161,9 +1064,84 @@ class Transformer(object):
         """
         from treecrawl.utility import string_to_file, mkdir_p
 
-        if type(s) != str:
+        if not isinstance(s, str):
             msg = "Expected string input. Got {}".format(str(type(s)))
             raise RuntimeError(msg)
         # ensure directory pah exists
         mkdir_p(o, is_file=True)
         string_to_file(s, o)
+
+    def write_output(self, s, o):
+        """write_string_to_output with this run's write settings
+
+        Creates the directory once per run (see make_output_dir) and is safe
+        to call from the threads of a thread backend run
+
+        If self.atomic_writes is True the file is replaced atomically.
+        self.durability controls when it's flushed to disk. see run()
+
+        If self.write_if_changed is True, a file that already has these
+        contents isn't rewritten, so its mtime is left alone. The "changed"
+        and "unchanged" files are counted in self.counts. bytes_written is
+        the size of the written file
+
+        :param str s: string data
+        :param str o: absolute path to the output file
+        """
+        from treecrawl.utility import string_to_file
+
+        if not isinstance(s, str):
+            msg = "Expected string input. Got {}".format(str(type(s)))
+            raise RuntimeError(msg)
+        start = perf_counter()
+        self.make_output_dir(o)
+        written = string_to_file(
+            s,
+            o,
+            atomic=self.atomic_writes,
+            fsync=self.durability == "file",
+            only_if_changed=self.write_if_changed,
+        )
+        self.time_phase("write", perf_counter() - start)
+        if written:
+            self.count_event("bytes_written", os.path.getsize(o))
+        if not self.write_if_changed:
+            self._wrote(o)
+        elif written:
+            self.count_event("changed")
+            self._wrote(o)
+        else:
+            self.count_event("unchanged")
+
+    def make_output_dir(self, o):
+        """Create the directory for an output file once per run
+
+        Directories created during the run are remembered, so files that
+        share a parent cost one mkdir_p instead of one each. Losing a race to
+        another thread just repeats the (safe) mkdir_p
+
+        :param str o: absolute path to the output file
+        """
+        from treecrawl.utility import mkdir_p
+
+        parent = os.path.dirname(o)
+        if parent in self._made_dirs:
+            return
+        mkdir_p(parent)
+        self._made_dirs.add(parent)
+
+    def _wrote(self, o):
+        """Queue a written file for the batched fsync
+
+        :param str o: absolute path to the output file
+        """
+        if self.durability == "batch":
+            # list.append is atomic so threads can share the list
+            self._unsynced.append(o)
+
+    def _sync_written(self):
+        """fsync the files queued by _wrote and their directories"""
+        from treecrawl.utility import fsync_paths
+
+        written, self._unsynced = self._unsynced, []
+        fsync_paths(written)
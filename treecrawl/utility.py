@@ -1,23 +1,7 @@
 import logging
-import sys
+from contextlib import contextmanager
 from typing import List
-
-
-def create_module_logger(mn):
-    ml = logging.getLogger(mn)
-    ml.setLevel(logging.INFO)
-
-    ch = logging.StreamHandler(sys.stdout)
-
-    formatter = logging.Formatter(
-        "%(asctime)s - {%(name)s} - "
-        "{%(filename)s:%(funcName)s:%(lineno)d} - "
-        "%(levelname)s - %(message)s"
-    )
-    ch.setFormatter(formatter)
-
-    ml.addHandler(ch)
-    return ml
+from .log import create_module_logger
 
 
 module_name = str(__name__)
@@ -126,15 +110,273 @@ def file_to_string(file_path):
     return data.decode("utf8", "ignore")
 
 
-def string_to_file(input_string, file_path):
+def string_to_file(
+    input_string, file_path, atomic=False, fsync=False, only_if_changed=False
+):
     """Write/Over-write a file's contents with a string
 
+    If atomic is True the string is written to a temp file that replaces
+    file_path, so a crash never leaves a truncated file behind
+
+    If only_if_changed is True and the file already has exactly these
+    contents, it isn't touched (so its mtime doesn't change)
 
     :param str input_string: string data
     :param str file_path: absolute path to a file
+    :param bool atomic: write a temp file and rename it over file_path
+    :param bool fsync: flush the file (and for atomic writes, the rename) to
+        disk before returning
+    :param bool only_if_changed: skip the write if the contents match
+
+    :rtype: bool
+    :return: False if the write was skipped
     """
+    import io
+    import os
+
+    if only_if_changed:
+        # encode exactly the way open(file_path, "w") would
+        buf = io.BytesIO()
+        with io.TextIOWrapper(buf, write_through=True) as w:
+            w.write(input_string)
+            data = buf.getvalue()
+        if file_has_contents(file_path, data):
+            return False
+    if atomic:
+        with _atomic_open(file_path, fsync, "w") as f:
+            f.write(input_string)
+        return True
     with open(file_path, "w") as f:
         f.write(input_string)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    return True
+
+
+def file_has_contents(file_path, data):
+    """Return True if the file contents are exactly data
+
+    The sizes are compared first so most changed files are never read
+
+    :param str file_path: absolute path to a file
+    :param bytes data: expected contents
+
+    :rtype: bool
+    """
+    import os
+
+    try:
+        size = os.stat(file_path).st_size
+    except FileNotFoundError:
+        return False
+    if size != len(data):
+        return False
+    view = memoryview(data)
+    chunk_size = 1024 * 1024
+    with open(file_path, "rb") as f:
+        for offset in range(0, size, chunk_size):
+            chunk = f.read(chunk_size)
+            if chunk != view[offset : offset + chunk_size]:  # noqa: E203
+                return False
+    return True
+
+
+def same_file_contents(left, right):
+    """Return True if two files have exactly the same contents
+
+    The sizes are compared first so most changed files are never read
+
+    :param str left: absolute path to a file
+    :param str right: absolute path to a file
+
+    :rtype: bool
+    """
+    import os
+
+    try:
+        if os.stat(left).st_size != os.stat(right).st_size:
+            return False
+    except FileNotFoundError:
+        return False
+    return _same_contents(left, right)
+
+
+def fsync_paths(paths):
+    """Flush files, then their parent directories, to disk
+
+    Syncing a batch of files once is much cheaper than syncing each file as
+    it's written. The directories are synced so renames are durable too
+
+    :param Iterable[str] paths: absolute paths to files
+    """
+    import os
+
+    dirs = set()
+    for p in paths:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        dirs.add(os.path.dirname(p))
+    for d in sorted(dirs):
+        _fsync_dir(d)
+
+
+def _fsync_dir(d):
+    import os
+
+    # windows can't open a directory
+    if os.name == "nt":
+        return
+    fd = os.open(d, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _atomic_open(file_path, fsync, mode, **kwargs):
+    """Open a temp file that replaces file_path when the with block exits
+
+    The temp file is removed if the block raises. If file_path is a
+    symlink the file it points to is replaced, so the link is kept like it
+    is by a plain open()
+
+    :rtype: Iterator[IO]
+    """
+    import os
+    import shutil
+    import threading
+
+    file_path = os.path.realpath(file_path)
+    tmp = "{}.{}.{}.tmp".format(file_path, os.getpid(), threading.get_ident())
+    f = open(tmp, mode, **kwargs)
+    try:
+        with f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp)
+        raise
+    try:
+        # keep the permissions of a file that's being replaced
+        shutil.copymode(file_path, tmp)
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, file_path)
+    if fsync:
+        _fsync_dir(os.path.dirname(file_path))
+
+
+@contextmanager
+def map_file(file_path):
+    """Memory map a file read only
+
+    The mapping supports the buffer protocol, so bytes regexes, find() and
+    slicing work on it without reading the file into a new buffer. Slices
+    are copies, so only copy what changes. Empty files can't be mapped and
+    yield b""
+
+    :param str file_path: absolute path to a file
+
+    :rtype: Iterator[Union[mmap.mmap, bytes]]
+    """
+    import mmap
+
+    with open(file_path, "rb") as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            yield b""
+            return
+        with m:
+            yield m
+
+
+def open_input(file_path, binary=False):
+    """Open a file for streaming reads
+
+    Text mode decodes utf-8 and drops undecodable bytes like file_to_string.
+    Line endings are left as they are
+
+    :param str file_path: absolute path to a file
+    :param bool binary: open in binary mode
+
+    :rtype: IO
+    """
+    if binary:
+        return open(file_path, "rb")
+    return open(file_path, "r", encoding="utf8", errors="ignore", newline="")
+
+
+@contextmanager
+def open_output(file_path, binary=False, fsync=False, make_dirs=True):
+    """Open a file for streaming writes and replace file_path when done
+
+    Writes go to a temp file in the destination directory. It's renamed over
+    file_path when the with block exits cleanly and removed if it raises, so
+    file_path is never left half written. That also makes it safe to stream
+    from a file to itself. If file_path is a symlink, the file it points to
+    is replaced. Missing directories are created
+
+    :param str file_path: absolute path to a file
+    :param bool binary: open in binary mode
+    :param bool fsync: flush the file and the rename to disk before
+        returning
+    :param bool make_dirs: set False if the directory is known to exist
+
+    :rtype: Iterator[IO]
+    """
+    if make_dirs:
+        mkdir_p(file_path, is_file=True)
+    if binary:
+        f = _atomic_open(file_path, fsync, "wb")
+    else:
+        f = _atomic_open(file_path, fsync, "w", encoding="utf8", newline="")
+    with f as writer:
+        yield writer
+
+
+@contextmanager
+def file_lock(key, shared=False):
+    """Hold an advisory lock shared by every process on this host
+
+    The lock file lives in the temp directory and is named after a hash of
+    key, so any string (like the path of the directory being protected)
+    can be locked without creating files next to it. Where fcntl isn't
+    available (windows) this doesn't lock
+
+    :param str key: what to lock
+    :param bool shared: take a shared (reader) lock instead of an exclusive
+        one
+
+    :rtype: Iterator[None]
+    """
+    import hashlib
+    import os
+    import tempfile
+
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    lock_dir = os.path.join(tempfile.gettempdir(), "treecrawl-locks")
+    mkdir_p(lock_dir)
+    name = hashlib.sha256(key.encode("utf8")).hexdigest() + ".lock"
+    with open(os.path.join(lock_dir, name), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
 
 
 def string_to_log_level(log_level_string):
@@ -171,6 +413,9 @@ def mkdir_p(target, is_file=False):
     """Create the directory path to the target.
     If the target is a file, create the path to its parent (directory)
 
+    It's safe for concurrent callers to create the same or overlapping paths.
+    Losing the race to create a directory is not an error
+
     :param str target: path to a target directory or file
     :param bool is_file: Indicates whether the target is a file
 
@@ -194,6 +439,67 @@ def mkdir_p(target, is_file=False):
     return path
 
 
+def iter_file_entries(target_dir, is_target_dir=None):
+    """Recurse the all subdirs and yield an os.DirEntry for every file
+
+    The entries come from os.scandir so is_file(), is_dir() and
+    is_symlink() usually cost nothing, and stat() is fetched at most once per
+    entry and cached (on Windows it's free). Use them instead of os.path
+    functions to avoid stating every file again.
+
+    Like os.walk, directories that can't be listed are skipped and symlinks to
+    directories are not followed or yielded. Each directory is listed in
+    full before any of its entries are yielded, so files the caller writes
+    into the tree while it crawls don't show up in a listing that's still
+    open
+
+    If is_target_dir is given it's called with the os.DirEntry of every
+    subdirectory. When it returns False the whole subtree is skipped without
+    being listed. Exceptions it raises aren't caught
+
+    :param str target_dir: directory to crawl
+    :param Callable[[os.DirEntry], bool] is_target_dir: subdirectory filter
+
+
+    :rtype: Iterator[os.DirEntry]
+    """
+    import os
+
+    stack = [target_dir]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                listing = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in listing:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry
+            elif entry.is_symlink():
+                continue
+            elif is_target_dir is None or is_target_dir(entry):
+                subdirs.append(entry.path)
+        # depth first in listing order, same as os.walk
+        stack.extend(reversed(subdirs))
+
+
+def iter_all_files(target_dir):
+    """Recurse the all subdirs and yield abs paths as they're found
+
+    :param str target_dir: directory to crawl
+
+
+    :rtype: Iterator[str]
+    """
+    for entry in iter_file_entries(target_dir):
+        yield entry.path
+
+
 def get_all_files(target_dir):
     """Recurse the all subdirs and list os abs paths
 
@@ -202,13 +508,86 @@ def get_all_files(target_dir):
 
     :rtype: List[str]
     """
+    return list(iter_all_files(target_dir))
+
+
+def copy_file(src, dst):
+    """Copy a file using the cheapest method the platform supports
+
+    Tries a reflink (copy on write clone, linux btrfs/xfs), then
+    os.copy_file_range (in kernel copy), then shutil.copyfile. The mode and
+    times are copied too
+
+    :param str src: absolute path to the source file
+    :param str dst: absolute path to the destination file
+    """
+    import shutil
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if not _reflink(fsrc.fileno(), fdst.fileno()):
+            if not _copy_file_range(fsrc.fileno(), fdst.fileno()):
+                shutil.copyfileobj(fsrc, fdst)
+    shutil.copystat(src, dst)
+
+
+def _reflink(src_fd, dst_fd):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    # linux FICLONE
+    try:
+        fcntl.ioctl(dst_fd, 0x40049409, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+def _copy_file_range(src_fd, dst_fd):
+    import os
+
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        while os.copy_file_range(src_fd, dst_fd, 1024**3):
+            pass
+    except OSError:
+        # nothing has been written yet if the first call fails
+        if os.lseek(dst_fd, 0, os.SEEK_CUR) != 0:
+            raise
+        return False
+    return True
+
+
+def copy_tree(src, dst, hardlink=False):
+    """Copy a directory tree, including empty directories
+
+    Files are copied with copy_file. If hardlink is True files are hard
+    linked instead, falling back to copy_file when the trees are on
+    different filesystems. Only hard link trees that won't be modified
+
+    :param str src: source directory
+    :param str dst: destination directory. created if it doesn't exist
+    :param bool hardlink: hard link files instead of copying them
+    """
     import os
 
-    res = []
-    for root, d_names, f_names in os.walk(target_dir):
+    for root, d_names, f_names in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        mkdir_p(target)
         for f in f_names:
-            res.append(os.path.join(root, f))
-    return res
+            s = os.path.join(root, f)
+            d = os.path.join(target, f)
+            # never write through an old hard link to the source tree
+            if os.path.lexists(d):
+                os.remove(d)
+            if hardlink:
+                try:
+                    os.link(s, d)
+                    continue
+                except OSError:
+                    pass
+            copy_file(s, d)
 
 
 def strip_suffix(s, suffix):
@@ -345,10 +724,217 @@ def locate_subdir(target_dir):
     return None
 
 
+class DirectoryDiff(object):
+    """Result of diff_directories
+
+    All of the paths are relative to the compared directories and sorted
+
+    missing(List[str]): files in the right directory that aren't in the left
+
+    extra(List[str]): files in the left directory that aren't in the right
+
+    different(List[str]): files in both directories with different contents
+
+    """
+
+    __slots__ = ("missing", "extra", "different")
+
+    def __init__(self, missing=None, extra=None, different=None):
+        self.missing = missing or []
+        self.extra = extra or []
+        self.different = different or []
+
+    @property
+    def identical(self):
+        return not (self.missing or self.extra or self.different)
+
+    def __repr__(self):
+        return "DirectoryDiff(missing={}, extra={}, different={})".format(
+            self.missing, self.extra, self.different
+        )
+
+
+def _relative_file_sizes(target_dir):
+    """Map the relative path of every file under target_dir to its size
+
+    :rtype: Dict[str, int]
+    """
+    import os
+
+    prefix = len(os.path.join(target_dir, ""))
+    return {
+        e.path[prefix:]: e.stat().st_size
+        for e in iter_file_entries(target_dir)
+    }
+
+
+def _same_contents(left, right, chunk_size=1024 * 1024):
+    """Compare two files of the same size chunk by chunk
+
+    Stops reading at the first chunk that differs
+
+    :rtype: bool
+    """
+    with open(left, "rb") as lf, open(right, "rb") as rf:
+        while True:
+            lc = lf.read(chunk_size)
+            if lc != rf.read(chunk_size):
+                return False
+            if not lc:
+                return True
+
+
+def diff_directories(d1, d2, jobs=None, stop_on_first=False):
+    """Report the differences between two directory trees
+
+    Each tree is crawled once. Files with different sizes are different
+    without being read. Files with the same size are compared chunk by chunk
+    in a thread pool
+
+    If stop_on_first is True, the comparison ends as soon as any difference
+    is found, so the report only shows some of the differences
+
+    :param str d1: left directory
+    :param str d2: right directory
+    :param int jobs: compare up to this many files at once. None lets
+        ThreadPoolExecutor decide
+    :param bool stop_on_first: return after the first difference
+
+    :rtype: DirectoryDiff
+    """
+    import os
+    from concurrent.futures import (
+        FIRST_COMPLETED,
+        ThreadPoolExecutor,
+        wait,
+    )
+
+    left = _relative_file_sizes(d1)
+    right = _relative_file_sizes(d2)
+    res = DirectoryDiff(
+        missing=sorted(right.keys() - left.keys()),
+        extra=sorted(left.keys() - right.keys()),
+    )
+    if stop_on_first and not res.identical:
+        return res
+
+    same_size = []
+    for rel in sorted(left.keys() & right.keys()):
+        if left[rel] != right[rel]:
+            res.different.append(rel)
+            if stop_on_first:
+                return res
+        else:
+            same_size.append(rel)
+
+    def compare(rel):
+        return rel, _same_contents(
+            os.path.join(d1, rel), os.path.join(d2, rel)
+        )
+
+    different = []
+    if jobs == 1:
+        for rel in same_size:
+            if not compare(rel)[1]:
+                different.append(rel)
+                if stop_on_first:
+                    break
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = {executor.submit(compare, rel) for rel in same_size}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel, same = future.result()
+                    if not same:
+                        different.append(rel)
+                if different and stop_on_first:
+                    for future in pending:
+                        future.cancel()
+                    break
+    res.different = sorted(res.different + different)
+    return res
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, read chunk by chunk
+
+    :param str file_path: absolute path to a file
+
+    :rtype: str
+    """
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tree_manifest(target_dir, jobs=None):
+    """Map the relative path of every file to its size and digest
+
+    The files are hashed in a thread pool
+
+    :param str target_dir: directory to crawl
+    :param int jobs: hash up to this many files at once
+
+    :rtype: Dict[str, Tuple[int, str]]
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    sizes = _relative_file_sizes(target_dir)
+    rels = sorted(sizes)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = executor.map(
+            file_digest, [os.path.join(target_dir, r) for r in rels]
+        )
+        return {r: (sizes[r], d) for r, d in zip(rels, digests)}
+
+
+def diff_manifest(target_dir, manifest, jobs=None):
+    """Compare a directory tree to a tree_manifest of the expected tree
+
+    Only target_dir is read. Files with the wrong size aren't hashed
+
+    :param str target_dir: directory to check (the left side)
+    :param Dict[str, Tuple[int, str]] manifest: from tree_manifest
+    :param int jobs: hash up to this many files at once
+
+    :rtype: DirectoryDiff
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    sizes = _relative_file_sizes(target_dir)
+    res = DirectoryDiff(
+        missing=sorted(manifest.keys() - sizes.keys()),
+        extra=sorted(sizes.keys() - manifest.keys()),
+    )
+    to_hash = []
+    for rel in sorted(sizes.keys() & manifest.keys()):
+        if sizes[rel] != manifest[rel][0]:
+            res.different.append(rel)
+        else:
+            to_hash.append(rel)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = executor.map(
+            file_digest, [os.path.join(target_dir, r) for r in to_hash]
+        )
+        for rel, digest in zip(to_hash, digests):
+            if digest != manifest[rel][1]:
+                res.different.append(rel)
+    res.different.sort()
+    return res
+
+
 def compare_directories(d1, d2):
     """Compare directories that should be exact matches
 
-
+    A file that only exists on one side is a mismatch. Use diff_directories
+    to find out what's different
 
     :param str d1: left directory
     :param str d2: left directory
@@ -356,17 +942,4 @@ def compare_directories(d1, d2):
 
     :rtype: bool
     """
-    import filecmp
-
-    # iterate d1 files and compare to companion d2 file
-    for left in get_all_files(d1):
-        right = output_file_from_input_file(d1, d2, left)
-        if not filecmp.cmp(left, right, shallow=False):
-            return False
-
-    # iterate d2 files and compare to companion d1 file
-    for right in get_all_files(d2):
-        left = output_file_from_input_file(d2, d1, right)
-        if not filecmp.cmp(right, left, shallow=False):
-            return False
-    return True
+    return diff_directories(d1, d2, stop_on_first=True).identical